@@ -9,7 +9,7 @@
 
 {
     'name': 'Systempay Payment Acquirer',
-    'version': '1.2.0',
+    'version': '1.3.0',
     'summary': 'Accept payments with Systempay secure payment gateway.',
     'category': 'Accounting',
     'author': 'Lyra Network',
@@ -19,7 +19,10 @@
     'data': [
         'views/payment_views.xml',
         'views/payment_systempay_templates.xml',
+        'views/systempay_stat_views.xml',
         'data/payment_acquirer_data.xml',
+        'data/ir_cron_data.xml',
+        'data/ir_actions_server_data.xml',
         'security/ir.model.access.csv',
     ],
     'images': ['static/description/icon.png'],
@@ -0,0 +1,210 @@
+# coding: utf-8
+#
+# Copyright © Lyra Network.
+# This file is part of Systempay plugin for Odoo. See COPYING.md for license details.
+#
+# Author:    Lyra Network (https://www.lyra.com)
+# Copyright: Copyright © Lyra Network
+# License:   http://www.gnu.org/licenses/agpl.html GNU Affero General Public License (AGPL v3)
+
+"""Benchmark of checkout and IPN hot paths, run on stand-in records without Odoo.
+
+    python benchmarks/bench_hot_paths.py                  # report ops/s and allocations
+    python benchmarks/bench_hot_paths.py --save           # store results as baseline
+    python benchmarks/bench_hot_paths.py --check          # exit with status 1 if slower than baseline
+
+Baselines depend on the machine, save them on the one used for checks.
+"""
+
+import argparse
+import json
+from os import path
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, path.dirname(path.abspath(__file__)))
+
+import odoo_standins
+
+odoo_standins.install()
+payment = odoo_standins.load('models.payment')
+notification = odoo_standins.load('models.notification')
+notification_log = odoo_standins.load('models.notification_log')
+stat = odoo_standins.load('models.stat')
+trans_id = odoo_standins.load('helpers.trans_id')
+
+BASELINE_FILE = path.join(path.dirname(path.abspath(__file__)), 'baseline.json')
+
+ACQUIRER_VALUES = {
+    'id': 1,
+    'provider': 'systempay',
+    'state': 'test',
+    'environment': 'test',
+    'company_id': odoo_standins.Model(id=1),
+    'write_date': '2020-04-07 12:00:00',
+    'systempay_site_id': '12345678',
+    'systempay_key_test': '1111111111111111',
+    'systempay_key_prod': '2222222222222222',
+    'systempay_sign_algo': 'SHA-256',
+    'systempay_language': 'fr',
+    'systempay_available_languages': [odoo_standins.Code('fr'), odoo_standins.Code('en')],
+    'systempay_capture_delay': '',
+    'systempay_validation_mode': '-1',
+    'systempay_payment_cards': [odoo_standins.Code('CB'), odoo_standins.Code('VISA')],
+    'systempay_threeds_min_amount': '',
+    'systempay_redirect_enabled': '1',
+    'systempay_redirect_success_timeout': '5',
+    'systempay_redirect_success_message': 'Redirection to shop in a few seconds...',
+    'systempay_redirect_error_timeout': '5',
+    'systempay_redirect_error_message': 'Redirection to shop in a few seconds...',
+    'systempay_return_mode': 'GET',
+    'systempay_ipn_mode': 'direct',
+    'systempay_multi_count': '3',
+    'systempay_multi_period': '30',
+    'systempay_multi_first': '',
+}
+
+def make_env():
+    env = odoo_standins.Env()
+    env['ir.config_parameter'] = odoo_standins.ConfigParameter({'web.base.url': 'https://shop.example.com'})
+    env['systempay.trans.id.block'] = odoo_standins.Allocator(trans_id)
+    env['systempay.notification.key'] = notification.SystempayNotificationKey(env)
+    env['systempay.notification.log'] = notification_log.SystempayNotificationLog(env)
+    env['systempay.stat'] = stat.SystempayStat(env)
+    return env
+
+def form_values(currency):
+    partner = {
+        'first_name': u'Hélène', 'last_name': 'Dupont', 'address': '1 rue de la Paix', 'zip': '75002',
+        'city': 'Paris', 'email': 'helene@example.com', 'phone': '0102030405',
+        'state': odoo_standins.Code(False), 'country': odoo_standins.Code('fr'),
+    }
+
+    values = {'reference': 'SO042-1', 'amount': 49.9, 'currency': currency, 'billing_partner_id': 7}
+    for k, v in partner.items():
+        values['billing_partner_' + k] = v
+        values['partner_' + k] = v
+
+    return values
+
+def notification_data(acquirer, status='AUTHORISED'):
+    data = {
+        'vads_site_id': '12345678', 'vads_ctx_mode': 'TEST', 'vads_order_id': 'SO042-1', 'vads_amount': '4990',
+        'vads_currency': '978', 'vads_trans_id': '000001', 'vads_trans_date': '20200407120000',
+        'vads_trans_uuid': 'a1b2c3d4e5f6a1b2c3d4e5f6a1b2c3d4', 'vads_trans_status': status, 'vads_result': '00',
+        'vads_auth_result': '00', 'vads_card_brand': 'CB', 'vads_card_number': '497010XXXXXX0000',
+        'vads_expiry_month': '6', 'vads_expiry_year': '2030', 'vads_threeds_status': 'Y', 'vads_threeds_cavv': 'Q2F2dg==',
+        'vads_url_check_src': 'PAY', 'vads_payment_config': 'SINGLE', 'vads_version': 'V2',
+    }
+    data['signature'] = acquirer._systempay_generate_sign(acquirer, data)
+    return data
+
+def make_cases():
+    env = make_env()
+    currency = odoo_standins.Code(name='EUR', decimal_places=2)
+
+    acquirers = {}
+    for algo in ('SHA-1', 'SHA-256'):
+        values = dict(ACQUIRER_VALUES, id=len(acquirers) + 1, systempay_sign_algo=algo)
+        acquirers[algo] = payment.AcquirerSystempay(env, **values)
+
+    acquirer = acquirers['SHA-256']
+    multi = payment.AcquirerSystempay(env, **dict(ACQUIRER_VALUES, id=3, provider='systempaymulti'))
+
+    tx = payment.TransactionSystempay(
+        env, id=1, reference='SO042-1', amount=49.9, currency_id=currency, acquirer_id=acquirer, state='draft', date=None,
+        systempay_trans_status=False, systempay_card_brand=False, systempay_threeds=False
+    )
+    data = notification_data(acquirer)
+    refused = notification_data(acquirer, 'REFUSED')
+    values = form_values(currency)
+
+    return [
+        ('generate_sign[SHA-1]', lambda: acquirers['SHA-1']._systempay_generate_sign(acquirers['SHA-1'], data)),
+        ('generate_sign[HMAC-SHA-256]', lambda: acquirer._systempay_generate_sign(acquirer, data)),
+        ('form_generate_values', lambda: acquirer._systempay_form_generate_values(values)),
+        ('form_generate_values[cached]', lambda: acquirer.systempay_form_generate_values(values)),
+        ('get_payment_config[single]', lambda: acquirer._get_payment_config(4990)),
+        ('get_payment_config[multi]', lambda: multi._get_payment_config(4990)),
+        ('route', lambda: acquirer._systempay_route(data)),
+        ('form_get_tx_from_data', lambda: tx._systempay_form_get_tx_from_data(data)),
+        ('form_validate[success]', lambda: tx._systempay_form_validate(data)),
+        ('form_validate[refused]', lambda: tx._systempay_form_validate(refused)),
+    ]
+
+def measure(func, number, repeat):
+    ops = number / min(timeit.repeat(func, number=number, repeat=repeat))
+
+    # Allocated blocks still alive after each call and peak memory of a call.
+    results = []
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for _i in range(100):
+        results.append(func())
+    after = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    allocs = sum(stat.count_diff for stat in after.compare_to(before, 'filename')) / 100.0
+    return {'ops': ops, 'allocs': max(0.0, allocs), 'peak': peak}
+
+def check(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if not reference:
+            continue
+
+        if result['ops'] < reference['ops'] * (1 - tolerance):
+            regressions.append('{}: {:,.0f} ops/s, baseline {:,.0f}'.format(name, result['ops'], reference['ops']))
+
+        if result['allocs'] > reference['allocs'] * (1 + tolerance) + 1:
+            regressions.append('{}: {:.1f} allocs/op, baseline {:.1f}'.format(name, result['allocs'], reference['allocs']))
+
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=2000, help='Calls per measure.')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of measures, best one is kept.')
+    parser.add_argument('--filter', default='', help='Only run cases whose name contains this text.')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='Baseline file.')
+    parser.add_argument('--save', action='store_true', help='Store results as baseline.')
+    parser.add_argument('--check', action='store_true', help='Fail if results regress compared to baseline.')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Accepted regression ratio, default is 0.2.')
+    args = parser.parse_args()
+
+    results = {}
+    print('{:<30} {:>14} {:>12} {:>12}'.format('case', 'ops/s', 'allocs/op', 'peak bytes'))
+    for name, func in make_cases():
+        if args.filter not in name:
+            continue
+
+        results[name] = measure(func, args.number, args.repeat)
+        print('{:<30} {ops:>14,.0f} {allocs:>12.1f} {peak:>12,}'.format(name, **results[name]))
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print('Baseline saved to {}.'.format(args.baseline))
+
+    if args.check:
+        if not path.exists(args.baseline):
+            print('No baseline found at {}, run with --save first.'.format(args.baseline))
+            return 2
+
+        with open(args.baseline) as f:
+            regressions = check(results, json.load(f), args.tolerance)
+
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+
+        return 1 if regressions else 0
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
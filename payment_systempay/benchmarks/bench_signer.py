@@ -0,0 +1,108 @@
+# coding: utf-8
+#
+# Copyright © Lyra Network.
+# This file is part of Systempay plugin for Odoo. See COPYING.md for license details.
+#
+# Author:    Lyra Network (https://www.lyra.com)
+# Copyright: Copyright © Lyra Network
+# License:   http://www.gnu.org/licenses/agpl.html GNU Affero General Public License (AGPL v3)
+
+"""Micro-benchmark of form signature computation.
+
+Compares the previous inline implementation of _systempay_generate_sign with SystempaySigner. Does not need Odoo:
+
+    python benchmarks/bench_signer.py [--number 20000]
+"""
+
+import argparse
+import base64
+from hashlib import sha1, sha256
+import hmac
+from os import path
+import sys
+import timeit
+
+# Helpers do not depend on Odoo.
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+from helpers.signer import SystempaySigner
+
+KEY = '1111111111111111'
+
+VALUES = {
+    'vads_site_id': '12345678',
+    'vads_amount': '4990',
+    'vads_currency': '978',
+    'vads_trans_date': '20200407120000',
+    'vads_trans_id': '432100',
+    'vads_ctx_mode': 'TEST',
+    'vads_page_action': 'PAYMENT',
+    'vads_action_mode': 'INTERACTIVE',
+    'vads_payment_config': 'SINGLE',
+    'vads_version': 'V2',
+    'vads_url_return': 'https://shop.example.com/payment/systempay/return',
+    'vads_order_id': 'SO042-1',
+    'vads_contrib': 'Odoo_10-13_1.3.0/13.0',
+    'vads_language': 'fr',
+    'vads_available_languages': '',
+    'vads_capture_delay': '',
+    'vads_validation_mode': '',
+    'vads_payment_cards': 'CB;VISA;MASTERCARD;',
+    'vads_return_mode': 'GET',
+    'vads_threeds_mpi': '',
+    'vads_cust_id': '7',
+    'vads_cust_first_name': u'Hélène',
+    'vads_cust_last_name': 'Dupont',
+    'vads_cust_address': '1 rue de la Paix',
+    'vads_cust_zip': '75002',
+    'vads_cust_city': 'Paris',
+    'vads_cust_country': 'FR',
+    'vads_cust_email': 'helene@example.com',
+    'vads_ship_to_first_name': u'Hélène',
+    'vads_ship_to_last_name': 'Dupont',
+    'vads_ship_to_street': '1 rue de la Paix',
+    'vads_ship_to_zip': '75002',
+    'vads_ship_to_city': 'Paris',
+    'vads_ship_to_country': 'FR',
+    'signature': 'ignored',
+}
+
+def legacy_sign(algo, key, values):
+    sign = ''
+    for k in sorted(values.keys()):
+        if k.startswith('vads_'):
+            sign += values[k] + '+'
+
+    sign += key
+
+    if algo == 'SHA-1':
+        return sha1(sign.encode('utf-8')).hexdigest()
+
+    return base64.b64encode(hmac.new(key.encode('utf-8'), sign.encode('utf-8'), sha256).digest()).decode('utf-8')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000, help='Signatures computed per measure.')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of measures, best one is kept.')
+    args = parser.parse_args()
+
+    for algo in ('SHA-1', 'SHA-256'):
+        signer = SystempaySigner(KEY, algo)
+        signature = legacy_sign(algo, KEY, VALUES)
+        assert signer.sign(VALUES) == signature
+
+        batch = [VALUES] * 100
+        cases = [
+            ('legacy', lambda: legacy_sign(algo, KEY, VALUES), 1),
+            ('signer.sign', lambda: signer.sign(VALUES), 1),
+            ('signer.verify', lambda: signer.verify(VALUES, signature), 1),
+            ('signer.sign_many', lambda: signer.sign_many(batch), len(batch)),
+        ]
+
+        for name, func, per_call in cases:
+            number = max(1, args.number // per_call)
+            best = min(timeit.repeat(func, number=number, repeat=args.repeat))
+            print('{:<8} {:<18} {:>12,.0f} ops/s'.format(algo, name, number * per_call / best))
+
+if __name__ == '__main__':
+    main()
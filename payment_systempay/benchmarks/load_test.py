@@ -0,0 +1,283 @@
+# coding: utf-8
+#
+# Copyright © Lyra Network.
+# This file is part of Systempay plugin for Odoo. See COPYING.md for license details.
+#
+# Author:    Lyra Network (https://www.lyra.com)
+# Copyright: Copyright © Lyra Network
+# License:   http://www.gnu.org/licenses/agpl.html GNU Affero General Public License (AGPL v3)
+
+"""Load test of a local Odoo, this script playing the Systempay payment page which sends IPN and return to shop.
+
+Forms are read from a JSON Lines file, one form as generated by systempay_form_generate_values per line. They can be
+created for draft transactions from an Odoo shell:
+
+    from odoo.addons.payment_systempay.benchmarks.load_test import export_forms
+    export_forms(env, env['payment.acquirer'].browse(ACQUIRER_ID), 5000, '/tmp/forms.jsonl')
+
+Then, with the key of the acquirer context mode:
+
+    python benchmarks/load_test.py /tmp/forms.jsonl --url http://localhost:8069 --key 1111111111111111 \\
+        --concurrency 500 --status AUTHORISED=85,REFUSED=10,ABANDONED=5 --duplicates 0.1 --return-first 0.3
+
+Each form signature is checked, then a signed IPN is sent and the customer returns to shop, with random delays.
+Throughput and latency percentiles of each route are reported at the end.
+"""
+
+import argparse
+import asyncio
+import json
+from os import path
+import random
+import ssl
+import sys
+import time
+import uuid
+
+from urllib.parse import urlencode, urlsplit
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+from helpers.signer import SystempaySigner
+
+IPN_PATH = '/payment/systempay/ipn'
+RETURN_PATH = '/payment/systempay/return'
+
+# Result codes sent with each status.
+RESULTS = {
+    'AUTHORISED': ('00', '00'),
+    'AUTHORISED_TO_VALIDATE': ('00', '00'),
+    'CAPTURED': ('00', '00'),
+    'REFUSED': ('05', '05'),
+    'ABANDONED': ('17', ''),
+}
+
+def export_forms(env, acquirer, count, file, amount=49.9, prefix='LOAD'):
+    """Create count draft transactions of acquirer and write their payment forms to file. To call from an Odoo shell."""
+
+    partner = env.user.partner_id
+    currency = acquirer.company_id.currency_id
+    run = uuid.uuid4().hex[:8].upper()
+
+    with open(file, 'w') as f:
+        for i in range(count):
+            reference = '{}-{}-{}'.format(prefix, run, i)
+            env['payment.transaction'].create({
+                'reference': reference, 'amount': amount, 'currency_id': currency.id, 'acquirer_id': acquirer.id,
+                'partner_id': partner.id,
+            })
+
+            values = {'reference': reference, 'amount': amount, 'currency': currency, 'billing_partner_id': partner.id}
+            for key in ('billing_partner_', 'partner_'):
+                values.update({
+                    key + 'first_name': partner.name, key + 'last_name': '', key + 'address': partner.street or '',
+                    key + 'zip': partner.zip or '', key + 'city': partner.city or '', key + 'email': partner.email or '',
+                    key + 'phone': partner.phone or '', key + 'state': partner.state_id, key + 'country': partner.country_id,
+                })
+
+            form = acquirer.systempay_form_generate_values(values)
+            form = dict((k, v.decode('utf-8') if isinstance(v, bytes) else v) for k, v in form.items())
+            form['signature'] = form.pop('systempay_signature')
+            f.write(json.dumps(form, sort_keys=True) + '\n')
+
+    env.cr.commit()
+
+def parse_mix(text):
+    """Weighted statuses from 'STATUS=weight,...'."""
+
+    mix = []
+    for item in text.split(','):
+        status, _sep, weight = item.partition('=')
+        mix.append((status.strip(), float(weight or 1)))
+
+    return mix
+
+def percentile(values, ratio):
+    if not values:
+        return 0.0
+
+    values = sorted(values)
+    return values[min(len(values) - 1, int(ratio * len(values)))]
+
+class Stats(object):
+    def __init__(self):
+        self.latencies = {}
+        self.codes = {}
+        self.errors = {}
+
+    def add(self, route, latency, code):
+        self.latencies.setdefault(route, []).append(latency)
+        self.codes.setdefault(route, {})
+        self.codes[route][code] = self.codes[route].get(code, 0) + 1
+
+    def error(self, route, error):
+        name = '{}: {}'.format(route, type(error).__name__)
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+    def report(self, elapsed, checkouts):
+        lines = ['{} checkouts in {:.1f}s, {:.1f} checkouts/s'.format(checkouts, elapsed, checkouts / elapsed if elapsed else 0)]
+        lines.append('{:<8} {:>8} {:>9} {:>9} {:>9} {:>9} {:>9}  {}'.format('route', 'requests', 'req/s', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms', 'HTTP codes'))
+        for route, latencies in sorted(self.latencies.items()):
+            lines.append('{:<8} {:>8} {:>9.1f} {:>9.1f} {:>9.1f} {:>9.1f} {:>9.1f}  {}'.format(
+                route, len(latencies), len(latencies) / elapsed if elapsed else 0,
+                percentile(latencies, 0.5) * 1000, percentile(latencies, 0.9) * 1000, percentile(latencies, 0.99) * 1000,
+                max(latencies) * 1000, ' '.join('{}:{}'.format(k, v) for k, v in sorted(self.codes[route].items()))
+            ))
+
+        for name, count in sorted(self.errors.items()):
+            lines.append('errors {}: {}'.format(name, count))
+
+        return '\n'.join(lines)
+
+async def http_request(url, method, route, params, timeout):
+    """Send one request on a new connection, return the HTTP status code."""
+
+    parts = urlsplit(url)
+    https = parts.scheme == 'https'
+    port = parts.port or (443 if https else 80)
+    body = urlencode(params)
+    target = parts.path.rstrip('/') + route
+
+    if method == 'GET':
+        target, body = target + '?' + body, ''
+
+    request = (
+        '{} {} HTTP/1.1\r\nHost: {}\r\nConnection: close\r\nContent-Type: application/x-www-form-urlencoded\r\n'
+        'Content-Length: {}\r\n\r\n{}'
+    ).format(method, target, parts.netloc, len(body), body)
+
+    context = ssl.create_default_context() if https else None
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(parts.hostname, port, ssl=context), timeout)
+    try:
+        writer.write(request.encode('utf-8'))
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+
+    return int(status_line.split()[1])
+
+class Simulator(object):
+    """Payment page stand-in: checks forms then sends their notifications and returns."""
+
+    def __init__(self, args):
+        self.args = args
+        self.signer = SystempaySigner(args.key, args.algo)
+        self.mix = parse_mix(args.status)
+        self.semaphore = asyncio.Semaphore(args.concurrency)
+        self.stats = Stats()
+        self.invalid_forms = 0
+
+    def notification(self, form):
+        status = random.choices([s for s, _w in self.mix], [w for _s, w in self.mix])[0]
+        result, auth_result = RESULTS.get(status, ('00', '00'))
+
+        data = dict((k, v) for k, v in form.items() if k.startswith('vads_'))
+        data.update({
+            'vads_trans_status': status,
+            'vads_trans_uuid': uuid.uuid4().hex,
+            'vads_result': result,
+            'vads_auth_result': auth_result,
+            'vads_card_brand': 'CB',
+            'vads_card_number': '497010XXXXXX0000',
+            'vads_expiry_month': '6',
+            'vads_expiry_year': '2030',
+            'vads_url_check_src': 'PAY',
+        })
+        data['signature'] = self.signer.sign(data)
+        return data
+
+    async def send(self, route_name, method, route, data, delay):
+        await asyncio.sleep(delay)
+        async with self.semaphore:
+            start = time.time()
+            try:
+                code = await http_request(self.args.url, method, route, data, self.args.timeout)
+            except Exception as e:
+                self.stats.error(route_name, e)
+                return
+
+            self.stats.add(route_name, time.time() - start, code)
+
+    async def checkout(self, form):
+        if not self.signer.verify(form, form.get('signature')):
+            self.invalid_forms += 1
+            return
+
+        data = self.notification(form)
+        ipn_delay = random.uniform(0, self.args.ipn_delay)
+        return_delay = random.uniform(0, self.args.return_delay)
+        if random.random() < self.args.return_first:
+            # Customer is back to shop before the IPN is sent.
+            ipn_delay, return_delay = max(ipn_delay, return_delay), min(ipn_delay, return_delay)
+
+        calls = [
+            self.send('ipn', 'POST', IPN_PATH, data, ipn_delay),
+            self.send('return', self.args.return_method, RETURN_PATH, data, return_delay),
+        ]
+        if random.random() < self.args.duplicates:
+            # Gateway retries the notification.
+            calls.append(self.send('ipn', 'POST', IPN_PATH, data, ipn_delay + random.uniform(0, self.args.ipn_delay)))
+
+        await asyncio.gather(*calls)
+
+    async def run(self, forms):
+        start = time.time()
+        tasks = []
+        for form in forms:
+            tasks.append(asyncio.ensure_future(self.checkout(form)))
+            if self.args.rate:
+                await asyncio.sleep(1.0 / self.args.rate)
+
+        await asyncio.gather(*tasks)
+        return time.time() - start
+
+def read_forms(file, limit=None):
+    forms = []
+    with open(file) as f:
+        for line in f:
+            if line.strip():
+                forms.append(json.loads(line))
+            if limit and len(forms) >= limit:
+                break
+
+    return forms
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('forms', help='JSON Lines file of payment forms.')
+    parser.add_argument('--url', default='http://localhost:8069', help='Odoo base URL.')
+    parser.add_argument('--key', required=True, help='Acquirer key of the forms context mode.')
+    parser.add_argument('--algo', default='SHA-256', choices=('SHA-1', 'SHA-256'), help='Signature algorithm.')
+    parser.add_argument('--limit', type=int, help='Number of forms to use, all by default.')
+    parser.add_argument('--concurrency', type=int, default=100, help='Requests in progress at most.')
+    parser.add_argument('--rate', type=float, default=0, help='Checkouts started per second, all at once by default.')
+    parser.add_argument('--status', default='AUTHORISED=90,REFUSED=10', help='Weighted statuses, STATUS=weight,...')
+    parser.add_argument('--ipn-delay', type=float, default=1.0, help='Maximum seconds before IPN is sent.')
+    parser.add_argument('--return-delay', type=float, default=2.0, help='Maximum seconds before customer returns.')
+    parser.add_argument('--return-first', type=float, default=0.0, help='Ratio of returns sent before the IPN.')
+    parser.add_argument('--return-method', default='GET', choices=('GET', 'POST'), help='As systempay_return_mode.')
+    parser.add_argument('--duplicates', type=float, default=0.0, help='Ratio of IPN sent twice.')
+    parser.add_argument('--timeout', type=float, default=30.0, help='Seconds before a request is abandoned.')
+    parser.add_argument('--seed', type=int, help='Random seed, to replay a run.')
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    forms = read_forms(args.forms, args.limit)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    simulator = Simulator(args)
+    elapsed = loop.run_until_complete(simulator.run(forms))
+    loop.close()
+
+    print(simulator.stats.report(elapsed, len(forms) - simulator.invalid_forms))
+    if simulator.invalid_forms:
+        print('{} forms with an invalid signature were skipped.'.format(simulator.invalid_forms))
+
+    return 1 if simulator.invalid_forms or simulator.stats.errors else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
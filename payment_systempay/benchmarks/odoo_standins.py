@@ -0,0 +1,216 @@
+# coding: utf-8
+#
+# Copyright © Lyra Network.
+# This file is part of Systempay plugin for Odoo. See COPYING.md for license details.
+#
+# Author:    Lyra Network (https://www.lyra.com)
+# Copyright: Copyright © Lyra Network
+# License:   http://www.gnu.org/licenses/agpl.html GNU Affero General Public License (AGPL v3)
+
+"""Lightweight stand-ins for the parts of Odoo used by the module, so its hot paths can be measured without a server
+or a database. Only meant for benchmarks: records are plain objects and ORM calls do nothing or return the record.
+"""
+
+from datetime import datetime
+import importlib
+from os import path
+import sys
+import types
+
+ADDON_DIR = path.dirname(path.dirname(path.abspath(__file__)))
+ADDON_NAME = 'odoo.addons.payment_systempay'
+
+def _module(name, **attrs):
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    sys.modules[name] = module
+
+    parent, _sep, child = name.rpartition('.')
+    if parent in sys.modules:
+        setattr(sys.modules[parent], child, module)
+
+    return module
+
+class Field(object):
+    def __init__(self, *args, **kwargs):
+        self.args, self.kwargs = args, kwargs
+
+class Datetime(Field):
+    @staticmethod
+    def now():
+        return datetime.utcnow().replace(microsecond=0)
+
+class Model(object):
+    """Single record whose field values are instance attributes."""
+
+    _context = {}
+
+    def __init__(self, env=None, **values):
+        self.env = env
+        self.__dict__.update(values)
+
+    def __iter__(self):
+        yield self
+
+    def __len__(self):
+        return 1
+
+    def __bool__(self):
+        return True
+
+    @property
+    def ids(self):
+        return [self.id]
+
+    def ensure_one(self):
+        return self
+
+    def browse(self, ids=None):
+        return self
+
+    def sudo(self, *args):
+        return self
+
+    def with_context(self, *args, **kwargs):
+        return self
+
+    def search(self, domain, **kwargs):
+        return self
+
+    def filtered(self, func):
+        return self
+
+    def create(self, values):
+        return self
+
+    def write(self, values):
+        self.__dict__.update(values)
+        return True
+
+    def clear_caches(self):
+        for func in _ormcached:
+            func.cache.clear()
+
+_ormcached = []
+
+def ormcache(*keys):
+    def decorator(func):
+        cache = {}
+
+        def wrapper(self, *args):
+            key = (func.__name__,) + args
+            if key not in cache:
+                cache[key] = func(self, *args)
+
+            return cache[key]
+
+        wrapper.cache = cache
+        _ormcached.append(wrapper)
+        return wrapper
+
+    return decorator
+
+class ValidationError(Exception):
+    pass
+
+def install(version='13.0'):
+    """Register stand-in odoo (and werkzeug, psycopg2, requests if missing) modules, replacing real ones if any."""
+
+    identity = lambda func: func
+    decorator = lambda *args, **kwargs: identity
+
+    odoo = _module('odoo', _=lambda s: s)
+    _module('odoo.release', version=version)
+    _module('odoo.api', model=identity, multi=identity, depends=decorator, Environment=None)
+    _module('odoo.models', Model=Model, AbstractModel=Model)
+    _module('odoo.fields', **dict((name, Field) for name in (
+        'Binary', 'Boolean', 'Char', 'Date', 'Float', 'Integer', 'Many2many', 'Many2one', 'One2many', 'Selection', 'Text'
+    )))
+    odoo.fields.Datetime = Datetime
+    _module('odoo.tools', ormcache=ormcache, config={}, convert_xml_import=lambda *args: None)
+    _module('odoo.http', Controller=object, route=decorator, request=None)
+    _module('odoo.cli', Command=object)
+    _module('odoo.addons')
+    _module('odoo.addons.payment')
+    _module('odoo.addons.payment.models')
+    _module('odoo.addons.payment.models.payment_acquirer', ValidationError=ValidationError)
+
+    _module('werkzeug')
+    _module('werkzeug.utils', redirect=lambda url: url)
+    _module('psycopg2', Binary=bytes)
+
+    # Web services are not called by benchmarks, requests is only needed to import them.
+    try:
+        import requests  # noqa: F401
+    except ImportError:
+        _module('requests', Session=object, ConnectionError=IOError, Timeout=IOError)
+        _module('requests.adapters', HTTPAdapter=object)
+
+    # Register the addon package without running its __init__ (which loads CLI commands).
+    addon = _module(ADDON_NAME)
+    addon.__path__ = [ADDON_DIR]
+
+def load(name):
+    return importlib.import_module(ADDON_NAME + '.' + name)
+
+class Cursor(object):
+    dbname = 'bench'
+
+    def execute(self, query, params=None):
+        pass
+
+    def fetchone(self):
+        return None
+
+    def after(self, event, func):
+        pass
+
+    def savepoint(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+class Env(dict):
+    """Map of model names to stand-in models."""
+
+    def __init__(self, *args, **kwargs):
+        super(Env, self).__init__(*args, **kwargs)
+        self.cr = Cursor()
+        self.context = {'lang': 'fr_FR'}
+
+class ConfigParameter(object):
+    def __init__(self, params):
+        self.params = params
+
+    def sudo(self):
+        return self
+
+    def get_param(self, key, default=None):
+        return self.params.get(key, default)
+
+class Allocator(object):
+    """In-memory systempay.trans.id.block."""
+
+    def __init__(self, trans_id):
+        counters = {}
+
+        def reserve(day, size):
+            start = counters.get(day, 0)
+            counters[day] = start + size
+            return start
+
+        self._allocator = trans_id.BlockTransIdAllocator(reserve, 50)
+
+    def sudo(self):
+        return self
+
+    def allocate(self, now):
+        return self._allocator.allocate(now)
+
+class Code(object):
+    def __init__(self, code=None, name=None, decimal_places=2):
+        self.code, self.name, self.decimal_places = code, name, decimal_places
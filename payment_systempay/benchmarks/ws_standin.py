@@ -0,0 +1,114 @@
+# coding: utf-8
+#
+# Copyright © Lyra Network.
+# This file is part of Systempay plugin for Odoo. See COPYING.md for license details.
+#
+# Author:    Lyra Network (https://www.lyra.com)
+# Copyright: Copyright © Lyra Network
+# License:   http://www.gnu.org/licenses/agpl.html GNU Affero General Public License (AGPL v3)
+
+"""Local stand-in for the gateway REST web services, to try synchronization and validation without the gateway.
+
+    python benchmarks/ws_standin.py --port 8070 --latency 0.05 --failures 0.1
+
+Then set the acquirer REST API URL to http://localhost:8070/api-payment/. Transactions are created on first read,
+with the status given by --status, and any password is accepted.
+"""
+
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import threading
+import time
+
+class Gateway(object):
+    """In-memory transactions, keyed by uuid."""
+
+    def __init__(self, status='AUTHORISED_TO_VALIDATE', latency=0.0, failures=0.0, amount=4990, currency='EUR'):
+        self.status, self.latency, self.failures = status, latency, failures
+        self.amount, self.currency = amount, currency
+        self.transactions = {}
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def _transaction(self, uuid):
+        if uuid not in self.transactions:
+            self.transactions[uuid] = {
+                'uuid': uuid,
+                'detailedStatus': self.status,
+                'amount': self.amount,
+                'currency': self.currency,
+                'orderDetails': {'orderId': None},
+                'transactionDetails': {'cardDetails': {'effectiveBrand': 'CB', 'pan': '497010XXXXXX0000'}},
+            }
+
+        return self.transactions[uuid]
+
+    def handle(self, path, payload):
+        time.sleep(self.latency)
+        with self._lock:
+            self.calls[path] = self.calls.get(path, 0) + 1
+            if random.random() < self.failures:
+                return 503, None
+
+            uuid = payload.get('uuid')
+            if not uuid:
+                return 200, self._error('INT_902', 'uuid is required')
+
+            transaction = self._transaction(uuid)
+            if path.endswith('/Transaction/Validate'):
+                if transaction['detailedStatus'] not in ('AUTHORISED_TO_VALIDATE', 'WAITING_AUTHORISATION_TO_VALIDATE'):
+                    return 200, self._error('PSP_010', 'transaction cannot be validated')
+
+                transaction['detailedStatus'] = 'AUTHORISED'
+            elif not path.endswith('/Transaction/Get'):
+                return 404, None
+
+            return 200, {'status': 'SUCCESS', 'answer': dict(transaction)}
+
+    @staticmethod
+    def _error(code, message):
+        return {'status': 'ERROR', 'answer': {'errorCode': code, 'errorMessage': message}}
+
+def make_server(gateway, host='localhost', port=0):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                payload = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                payload = {}
+
+            status, body = gateway.handle(self.path, payload)
+            data = json.dumps(body).encode('utf-8') if body is not None else b''
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8070)
+    parser.add_argument('--status', default='AUTHORISED_TO_VALIDATE', help='Status of new transactions.')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to each answer.')
+    parser.add_argument('--failures', type=float, default=0.0, help='Ratio of calls answered with HTTP 503.')
+    args = parser.parse_args()
+
+    gateway = Gateway(args.status, args.latency, args.failures)
+    server = make_server(gateway, args.host, args.port)
+    print('Gateway stand-in listening on http://{}:{}/api-payment/'.format(args.host, server.server_port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+# coding: utf-8
+#
+# Copyright © Lyra Network.
+# This file is part of Systempay plugin for Odoo. See COPYING.md for license details.
+#
+# Author:    Lyra Network (https://www.lyra.com)
+# Copyright: Copyright © Lyra Network
+# License:   http://www.gnu.org/licenses/agpl.html GNU Affero General Public License (AGPL v3)
+
+import argparse
+import logging
+import sys
+
+import odoo
+from odoo.cli import Command
+from odoo.tools import config
+
+from ..helpers import export
+
+_logger = logging.getLogger(__name__)
+
+class SystempayExport(Command):
+    """Export Systempay transactions created over a period as CSV or JSON Lines"""
+
+    def run(self, cmdargs):
+        parser = argparse.ArgumentParser(prog='odoo-bin systempayexport', description=self.__doc__)
+        parser.add_argument('-c', '--config', dest='config', help='Odoo configuration file.')
+        parser.add_argument('-d', '--database', dest='db_name', help='Database name.')
+        parser.add_argument('--from', dest='date_from', required=True, help='First creation day (YYYY-MM-DD).')
+        parser.add_argument('--to', dest='date_to', required=True, help='Day after the last creation day (YYYY-MM-DD).')
+        parser.add_argument('--format', choices=sorted(export.FORMATS), default='csv', help='Output format, default is csv.')
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Rows read at a time.')
+        parser.add_argument('--output', help='Output file, default is standard output.')
+        args = parser.parse_args(cmdargs)
+
+        odoo_args = []
+        if args.config:
+            odoo_args += ['-c', args.config]
+        if args.db_name:
+            odoo_args += ['-d', args.db_name]
+        config.parse_config(odoo_args)
+
+        dbname = config['db_name']
+        if not dbname:
+            parser.error('a database name is required.')
+
+        output = open(args.output, 'wb') if args.output else getattr(sys.stdout, 'buffer', sys.stdout)
+        try:
+            self.export(dbname, args, output)
+        finally:
+            if args.output:
+                output.close()
+
+    def export(self, dbname, args, output):
+        registry = odoo.registry(dbname)
+
+        with registry.cursor() as cr:
+            env = odoo.api.Environment(cr, odoo.SUPERUSER_ID, {})
+            chunks = env['payment.transaction']._systempay_export_chunks(args.date_from, args.date_to, args.chunk_size)
+
+            size = 0
+            for data in export.format_chunks(chunks, args.format):
+                output.write(data)
+                size += len(data)
+
+        _logger.info('Systempay: transactions from %s to %s exported, %s bytes.', args.date_from, args.date_to, size)
+        return size
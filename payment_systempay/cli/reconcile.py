@@ -0,0 +1,97 @@
+# coding: utf-8
+#
+# Copyright © Lyra Network.
+# This file is part of Systempay plugin for Odoo. See COPYING.md for license details.
+#
+# Author:    Lyra Network (https://www.lyra.com)
+# Copyright: Copyright © Lyra Network
+# License:   http://www.gnu.org/licenses/agpl.html GNU Affero General Public License (AGPL v3)
+
+import argparse
+import csv
+import logging
+import multiprocessing
+import os
+import sys
+
+import odoo
+from odoo.cli import Command
+from odoo.tools import config
+
+from ..helpers import reconcile
+
+_logger = logging.getLogger(__name__)
+
+class SystempayReconcile(Command):
+    """Reconcile Systempay transactions with a back office export file"""
+
+    def run(self, cmdargs):
+        parser = argparse.ArgumentParser(prog='odoo-bin systempayreconcile', description=self.__doc__)
+        parser.add_argument('file', help='Systempay transaction export (CSV).')
+        parser.add_argument('-c', '--config', dest='config', help='Odoo configuration file.')
+        parser.add_argument('-d', '--database', dest='db_name', help='Database name.')
+        parser.add_argument('--delimiter', default=',', help='CSV delimiter, default is ",".')
+        parser.add_argument('--encoding', default='utf-8', help='File encoding, default is utf-8.')
+        parser.add_argument('--column', action='append', default=[], metavar='KEY=HEADER',
+                            help='Header of the export column holding reference, uuid, amount, currency or status.')
+        parser.add_argument('--amount-unit', choices=['minor', 'major'], default='minor',
+                            help='Whether export amounts are in cents (minor) or in currency units (major).')
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Rows read and matched at a time.')
+        parser.add_argument('--workers', type=int, default=0,
+                            help='Parsing processes. Default is one per CPU for files over 100 MB, none otherwise.')
+        parser.add_argument('--fix', action='store_true', help='Update states of transactions not matching export status.')
+        parser.add_argument('--output', help='Mismatch report file (CSV), default is standard output.')
+        args = parser.parse_args(cmdargs)
+
+        odoo_args = []
+        if args.config:
+            odoo_args += ['-c', args.config]
+        if args.db_name:
+            odoo_args += ['-d', args.db_name]
+        config.parse_config(odoo_args)
+
+        dbname = config['db_name']
+        if not dbname:
+            parser.error('a database name is required.')
+
+        columns = dict(reconcile.EXPORT_COLUMNS)
+        for item in args.column:
+            key, _sep, header = item.partition('=')
+            if key not in columns or not header:
+                parser.error('invalid column {}.'.format(item))
+            columns[key] = header
+
+        workers = args.workers
+        if not workers and os.path.getsize(args.file) > 100 * 1024 * 1024:
+            workers = multiprocessing.cpu_count()
+
+        output = open(args.output, 'w') if args.output else sys.stdout
+        pool = multiprocessing.Pool(workers) if workers > 1 else None
+        try:
+            self.reconcile(dbname, args, columns, pool, csv.writer(output))
+        finally:
+            if pool is not None:
+                pool.terminate()
+            if args.output:
+                output.close()
+
+    def reconcile(self, dbname, args, columns, pool, writer):
+        registry = odoo.registry(dbname)
+        writer.writerow(['reference', 'field', 'export', 'odoo'])
+
+        total = mismatched = 0
+        with reconcile.open_export(args.file, args.encoding) as file:
+            for rows in reconcile.parse_chunks(file, columns, args.chunk_size, pool, delimiter=args.delimiter):
+                # One transaction per chunk: memory and locks do not grow with file size.
+                with registry.cursor() as cr:
+                    env = odoo.api.Environment(cr, odoo.SUPERUSER_ID, {})
+                    mismatches = env['payment.transaction']._systempay_reconcile(rows, args.amount_unit, args.fix)
+
+                for mismatch in mismatches:
+                    writer.writerow(mismatch)
+
+                total += len(rows)
+                mismatched += len(mismatches)
+                _logger.info('Systempay: %s rows reconciled, %s mismatches.', total, mismatched)
+
+        return total, mismatched
@@ -7,47 +7,184 @@
 # Copyright: Copyright © Lyra Network
 # License:   http://www.gnu.org/licenses/agpl.html GNU Affero General Public License (AGPL v3)
 
+from datetime import datetime
+import hmac
 import logging
-import pprint
 
-from pkg_resources import parse_version
 import werkzeug
 
 from odoo import http, release
 from odoo.http import request
+from odoo.tools import config
+
+from ..helpers import export, log, tools
+from ..helpers.metrics import metrics
+from ..helpers.ratelimit import TokenBucketLimiter
+from ..helpers.version import version_tuple
 
 
 _logger = logging.getLogger(__name__)
 
+_odoo_version = version_tuple(release.version)
+
+# Log one request out of systempay_log_sample_rate (from Odoo configuration file).
+_sampler = log.Sampler(config.get('systempay_log_sample_rate', 1))
+
+# Collect checkout and IPN timings if systempay_metrics is set in Odoo configuration file. They are served to requests
+# with header "Authorization: Bearer <systempay_metrics_token>" only.
+metrics.enabled = bool(config.get('systempay_metrics'))
+_metrics_token = config.get('systempay_metrics_token') or ''
+
+# Invalid signed requests accepted per client IP address: systempay_invalid_rate per second, bursts of systempay_invalid_burst.
+_limiter = TokenBucketLimiter(config.get('systempay_invalid_rate', 1), config.get('systempay_invalid_burst', 10))
+
+# Seconds the return to shop waits for a notification of the same transaction being applied. After that, the customer
+# is redirected from the returned status and the order is left to the notification.
+_return_wait = float(config.get('systempay_return_wait', 2))
+
 class SystempayController(http.Controller):
     _notify_url = '/payment/systempay/ipn'
     _return_url = '/payment/systempay/return'
+    _metrics_url = '/payment/systempay/metrics'
+    _export_url = '/payment/systempay/export'
 
     def _get_return_url(self, result, **post):
         return_url = post.pop('return_url', '')
 
         if not return_url:
             if result:
-                old_version = True if parse_version(release.version) < parse_version('12') else False
+                old_version = _odoo_version < (12, 0)
                 return_url = '/shop/payment/validate' if old_version else '/payment/process'
             else:
                 return_url = '/shop/cart'
 
         return return_url
 
+    def _get_route(self, post):
+        """Return the route of the acquirer that signed the request and None, or None and an error response if request is
+        not signed by a known shop. Does not query database.
+        """
+
+        # Valid requests are never limited, signature check does not query database.
+        route = request.env['payment.acquirer'].sudo()._systempay_route(post)
+        if route is not None:
+            return route, None
+
+        ip = request.httprequest.remote_addr
+        if not _limiter.allowed(ip):
+            metrics.inc('systempay_rate_limited_total')
+            return None, self._error_response('Too many invalid requests.', 429)
+
+        _limiter.consume(ip)
+        metrics.inc('systempay_signature_failures_total')
+        log.log_data(_logger, logging.INFO, 'Systempay: rejected request with invalid signature %s', post, _sampler)
+        return None, self._error_response('Invalid signature.', 400)
+
+    def _get_transactions(self, route):
+        # Signature is already checked with the acquirer key, run in the acquirer company.
+        return request.env['payment.transaction'].sudo().with_context(
+            systempay_acquirer_id=route.acquirer_id, force_company=route.company_id
+        )
+
+    def _get_tx_transactions(self, tx):
+        # Acquirers of the same shop share their key, run with the acquirer of the transaction once it is known.
+        return request.env['payment.transaction'].sudo().with_context(
+            systempay_acquirer_id=tx.acquirer_id.id, force_company=tx.acquirer_id.company_id.id
+        )
+
+    def _error_response(self, message, status):
+        response = request.make_response(message, headers=[('Content-Type', 'text/plain')])
+        response.status_code = status
+        return response
+
     @http.route('/payment/systempay/return', type='http', auth='none', methods=['POST', 'GET'], csrf=False)
     def systempay_return(self, **post):
-        _logger.info('Systempay: entering form_feedback with post data %s', pprint.pformat(post))
+        log.log_data(_logger, logging.INFO, 'Systempay: entering form_feedback with post data %s', post, _sampler)
+
+        with metrics.timer('systempay_request_seconds', route='return'):
+            route, error = self._get_route(post)
+            if error is not None:
+                return error
+
+            tx = self._get_transactions(route)._systempay_form_get_tx_from_data(post)
+            transactions = self._get_tx_transactions(tx)
+
+            # Wait a little for a notification of the same order being applied.
+            with metrics.timer('systempay_stage_seconds', stage='lock'):
+                locked = transactions._systempay_lock_fresh([post.get('vads_order_id')], _return_wait)
+
+            if locked:
+                # Check payment result and create transaction.
+                result = transactions.form_feedback(post, 'systempay')
+            else:
+                # Notification is still being applied, it will update the order: answer from the signed status only.
+                result = tools.get_tx_state(post.get('vads_trans_status')) in ('done', 'pending')
 
-        # Check payment result and create transaction.
-        result = request.env['payment.transaction'].sudo().form_feedback(post, 'systempay')
         return_url = self._get_return_url(result, **post)
         return werkzeug.utils.redirect(return_url)
 
     @http.route('/payment/systempay/ipn', type='http', auth='none', methods=['POST'], csrf=False)
     def systempay_ipn(self, **post):
-        _logger.info('Systempay: entering IPN form_feedback with post data %s', pprint.pformat(post))
+        log.log_data(_logger, logging.INFO, 'Systempay: entering IPN form_feedback with post data %s', post, _sampler)
+
+        with metrics.timer('systempay_request_seconds', route='ipn'):
+            route, error = self._get_route(post)
+            if error is not None:
+                return error
+
+            tx = self._get_transactions(route)._systempay_form_get_tx_from_data(post)
+            transactions = self._get_tx_transactions(tx)
+
+            # In queued mode, store notification to be applied in background.
+            if tx.acquirer_id.systempay_ipn_mode == 'queued':
+                with metrics.timer('systempay_stage_seconds', stage='enqueue'):
+                    request.env['systempay.ipn.queue'].sudo()._enqueue(tx, post)
+
+                return 'Notification accepted, order will be updated.'
+
+            # Wait for return to shop or notifications of the same order being handled.
+            with metrics.timer('systempay_stage_seconds', stage='lock'):
+                transactions._systempay_lock_fresh([post.get('vads_order_id')])
+
+            # Check payment result and create transaction, reusing transaction found above.
+            result = transactions.with_context(systempay_tx_ids=tuple(tx.ids)).form_feedback(post, 'systempay')
 
-        # Check payment result and create transaction.
-        result = request.env['payment.transaction'].sudo().form_feedback(post, 'systempay')
         return 'Accepted payment, order has been updated.' if result else 'Payment failure, order has been cancelled.'
+
+    @http.route('/payment/systempay/metrics', type='http', auth='none', methods=['GET'], csrf=False)
+    def systempay_metrics(self, **get):
+        if not metrics.enabled or not _metrics_token:
+            return request.not_found()
+
+        authorization = request.httprequest.headers.get('Authorization') or ''
+        if not hmac.compare_digest(authorization.encode('utf-8'), ('Bearer ' + _metrics_token).encode('utf-8')):
+            return self._error_response('Unauthorized.', 401)
+
+        return request.make_response(metrics.render(), headers=[('Content-Type', 'text/plain; version=0.0.4')])
+
+    @http.route('/payment/systempay/export', type='http', auth='user', methods=['GET'])
+    def systempay_export(self, date_from=None, date_to=None, format='csv', **get):
+        """Stream Systempay transactions created from date_from and before date_to (YYYY-MM-DD), as CSV or JSON Lines."""
+
+        if not request.env.user.has_group('base.group_system'):
+            return self._error_response('Forbidden.', 403)
+
+        try:
+            datetime.strptime(date_from or '', '%Y-%m-%d')
+            datetime.strptime(date_to or '', '%Y-%m-%d')
+        except ValueError:
+            return self._error_response('date_from and date_to are required, as YYYY-MM-DD.', 400)
+
+        if format not in export.FORMATS:
+            return self._error_response('Unknown format.', 400)
+
+        chunks = request.env['payment.transaction'].sudo()._systempay_export_chunks(date_from, date_to)
+        filename = 'systempay-{}-{}.{}'.format(date_from, date_to, format)
+
+        # Rows are written as they are read, response is not buffered.
+        return http.Response(
+            export.format_chunks(chunks, format), direct_passthrough=True, headers=[
+                ('Content-Type', export.FORMATS[format]),
+                ('Content-Disposition', 'attachment; filename="{}"'.format(filename)),
+            ]
+        )
@@ -7,4 +7,6 @@
 # Copyright: Copyright © Lyra Network
 # License:   http://www.gnu.org/licenses/agpl.html GNU Affero General Public License (AGPL v3)
 
+# Pure Python code shared by models, controllers and tools. Must not import Odoo at module level.
+
 from . import constants
@@ -7,8 +7,6 @@
 # Copyright: Copyright © Lyra Network
 # License:   http://www.gnu.org/licenses/agpl.html GNU Affero General Public License (AGPL v3)
 
-from odoo import _
-
 # WARN: Do not modify code format here. This is managed by build files. 
 SYSTEMPAY_PLUGIN_FEATURES = {
     'multi': True,
@@ -23,6 +21,7 @@ SYSTEMPAY_PARAMS = {
     'BACKOFFICE_NAME': 'Systempay',
     'SUPPORT_EMAIL': 'supportvad@lyra-network.com',
     'GATEWAY_URL': 'https://paiement.systempay.fr/vads-payment/',
+    'WS_URL': 'https://api.systempay.fr/api-payment/',
     'SITE_ID': '12345678',
     'KEY_TEST': '1111111111111111',
     'KEY_PROD': '2222222222222222',
@@ -31,7 +30,7 @@ SYSTEMPAY_PARAMS = {
     'LANGUAGE': 'fr',
 
     'GATEWAY_VERSION': 'V2',
-    'PLUGIN_VERSION': '1.2.0',
+    'PLUGIN_VERSION': '1.3.0',
     'CMS_IDENTIFIER': 'Odoo_10-13',
 }
 
@@ -98,6 +97,16 @@ SYSTEMPAY_CARDS = {
     'ONEY_ENSEIGNE': u'Cartes enseignes Oney',
 }
 
+# Odoo transaction state by gateway transaction status. Other statuses are errors.
+SYSTEMPAY_STATUSES = {
+    'success': ['AUTHORISED', 'CAPTURED', 'ACCEPTED'],
+    'pending': ['AUTHORISED_TO_VALIDATE', 'WAITING_AUTHORISATION', 'WAITING_AUTHORISATION_TO_VALIDATE', 'INITIAL', 'UNDER_VERIFICATION', 'WAITING_FOR_PAYMENT', 'PRE_AUTHORISED'],
+    'cancel': ['ABANDONED']
+}
+
+# Statuses of payments waiting for a manual validation in gateway.
+SYSTEMPAY_TO_VALIDATE_STATUSES = ['AUTHORISED_TO_VALIDATE', 'WAITING_AUTHORISATION_TO_VALIDATE']
+
 SYSTEMPAY_CURRENCIES = [
     ['AUD', '036', 2],
     ['KHR', '116', 0],
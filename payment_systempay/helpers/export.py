@@ -0,0 +1,73 @@
+# coding: utf-8
+#
+# Copyright © Lyra Network.
+# This file is part of Systempay plugin for Odoo. See COPYING.md for license details.
+#
+# Author:    Lyra Network (https://www.lyra.com)
+# Copyright: Copyright © Lyra Network
+# License:   http://www.gnu.org/licenses/agpl.html GNU Affero General Public License (AGPL v3)
+
+import csv
+from datetime import date, datetime
+from decimal import Decimal
+import io
+import json
+import sys
+
+_PY2 = sys.version_info[0] < 3
+
+# Columns of exported transaction rows, in order.
+EXPORT_COLUMNS = (
+    'reference', 'amount', 'currency', 'card_brand', 'card_number', 'trans_status', 'state', 'acquirer_reference',
+    'create_date', 'validation_date',
+)
+
+# Export formats and their content type.
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+def _csv_value(value):
+    if value is None:
+        return ''
+
+    if _PY2 and isinstance(value, unicode): # noqa: F821
+        return value.encode('utf-8')
+
+    return value
+
+def _json_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+
+    if isinstance(value, Decimal):
+        return float(value)
+
+    return value
+
+def _csv_chunk(rows):
+    buffer = io.BytesIO() if _PY2 else io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    for row in rows:
+        writer.writerow([_csv_value(v) for v in row])
+
+    data = buffer.getvalue()
+    return data if _PY2 else data.encode('utf-8')
+
+def _jsonl_chunk(rows):
+    lines = [json.dumps(dict(zip(EXPORT_COLUMNS, [_json_value(v) for v in row])), sort_keys=True) for row in rows]
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+def format_chunks(chunks, fmt='csv'):
+    """Yield UTF-8 encoded text of each list of rows in chunks, rows being tuples of values in EXPORT_COLUMNS order.
+
+    CSV starts with a header line. Only one chunk is held at a time.
+    """
+
+    if fmt == 'csv':
+        yield _csv_chunk([EXPORT_COLUMNS])
+
+    write = _csv_chunk if fmt == 'csv' else _jsonl_chunk
+    for rows in chunks:
+        yield write(rows)
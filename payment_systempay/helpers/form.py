@@ -0,0 +1,54 @@
+# coding: utf-8
+#
+# Copyright © Lyra Network.
+# This file is part of Systempay plugin for Odoo. See COPYING.md for license details.
+#
+# Author:    Lyra Network (https://www.lyra.com)
+# Copyright: Copyright © Lyra Network
+# License:   http://www.gnu.org/licenses/agpl.html GNU Affero General Public License (AGPL v3)
+
+# Customer and shipping form fields: (gateway field, Odoo payment value, max length).
+_CUSTOMER_FIELDS = [
+    ('vads_cust_first_name', 'billing_partner_first_name', 62),
+    ('vads_cust_last_name', 'billing_partner_last_name', 62),
+    ('vads_cust_address', 'billing_partner_address', 254),
+    ('vads_cust_zip', 'billing_partner_zip', 62),
+    ('vads_cust_city', 'billing_partner_city', 62),
+    ('vads_cust_email', 'billing_partner_email', 126),
+    ('vads_cust_phone', 'billing_partner_phone', 31),
+
+    ('vads_ship_to_first_name', 'partner_first_name', 62),
+    ('vads_ship_to_last_name', 'partner_last_name', 62),
+    ('vads_ship_to_street', 'partner_address', 254),
+    ('vads_ship_to_zip', 'partner_zip', 62),
+    ('vads_ship_to_city', 'partner_city', 62),
+    ('vads_ship_to_phone_num', 'partner_phone', 31),
+]
+
+def order_fields(values):
+    """Customer and shipping form fields from payment values, as passed to <provider>_form_generate_values."""
+
+    fields = {'vads_cust_id': str(values.get('billing_partner_id')) or ''}
+    for field, key, length in _CUSTOMER_FIELDS:
+        fields[field] = values.get(key) and values.get(key)[0:length] or ''
+
+    for prefix, key in (('vads_cust_', 'billing_partner_'), ('vads_ship_to_', 'partner_')):
+        state, country = values.get(key + 'state'), values.get(key + 'country')
+        fields[prefix + 'state'] = state.code and state.code[0:62] or ''
+        fields[prefix + 'country'] = country.code and country.code.upper() or ''
+
+    return fields
+
+def multi_payment_config(first, count, period):
+    return u'MULTI:first=' + str(first) + u';count=' + count + u';period=' + period
+
+def clean_values(values):
+    # Gateway rejects values made of a single space.
+    for key in values:
+        if values[key] == ' ':
+            values[key] = ''
+
+    return values
+
+def encode_values(values):
+    return dict((k, v.encode('utf-8')) for k, v in values.items())
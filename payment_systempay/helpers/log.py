@@ -0,0 +1,72 @@
+# coding: utf-8
+#
+# Copyright © Lyra Network.
+# This file is part of Systempay plugin for Odoo. See COPYING.md for license details.
+#
+# Author:    Lyra Network (https://www.lyra.com)
+# Copyright: Copyright © Lyra Network
+# License:   http://www.gnu.org/licenses/agpl.html GNU Affero General Public License (AGPL v3)
+
+import itertools
+import re
+
+# Gateway fields that may be written to logs, others are dropped.
+LOGGED_FIELDS = frozenset([
+    'vads_action_mode', 'vads_amount', 'vads_auth_mode', 'vads_auth_result', 'vads_card_brand', 'vads_card_number',
+    'vads_ctx_mode', 'vads_currency', 'vads_effective_amount', 'vads_extra_result', 'vads_hash', 'vads_operation_type',
+    'vads_order_id', 'vads_page_action', 'vads_payment_config', 'vads_result', 'vads_sequence_number', 'vads_site_id',
+    'vads_threeds_status', 'vads_trans_date', 'vads_trans_id', 'vads_trans_status', 'vads_trans_uuid',
+    'vads_url_check_src', 'vads_validation_mode', 'vads_version', 'vads_warranty_result',
+])
+
+MASKED_FIELDS = frozenset(['vads_card_number'])
+
+_DIGITS = re.compile(r'\d')
+
+def mask(value):
+    # Keep the last 4 digits only.
+    value = u'{}'.format(value)
+    return _DIGITS.sub('X', value[:-4]) + value[-4:]
+
+def redact(data):
+    values = {}
+    for k in data:
+        if k not in LOGGED_FIELDS:
+            continue
+
+        values[k] = mask(data[k]) if (k in MASKED_FIELDS and data[k]) else data[k]
+
+    return values
+
+class LazyData(object):
+    """Redacted key=value representation of gateway data, only built when the log record is emitted."""
+
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data
+
+    def __str__(self):
+        values = redact(self.data or {})
+        return u' '.join(u'{}={}'.format(k, values[k]) for k in sorted(values))
+
+    __unicode__ = __str__
+
+class Sampler(object):
+    """Let through one call out of rate."""
+
+    def __init__(self, rate=1):
+        self.rate = max(1, int(rate or 1))
+        self._counter = itertools.count()
+
+    def __call__(self):
+        return self.rate == 1 or next(self._counter) % self.rate == 0
+
+def log_data(logger, level, msg, data, sampler=None):
+    if not logger.isEnabledFor(level):
+        return
+
+    if sampler is not None and not sampler():
+        return
+
+    logger.log(level, msg, LazyData(data))
@@ -0,0 +1,47 @@
+# coding: utf-8
+#
+# Copyright © Lyra Network.
+# This file is part of Systempay plugin for Odoo. See COPYING.md for license details.
+#
+# Author:    Lyra Network (https://www.lyra.com)
+# Copyright: Copyright © Lyra Network
+# License:   http://www.gnu.org/licenses/agpl.html GNU Affero General Public License (AGPL v3)
+
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+def run_bounded(func, items, workers=4):
+    """Call func on each item with at most workers threads at a time.
+
+    Return a list aligned with items holding each result, or the exception raised for the item.
+    """
+
+    items = list(items)
+    results = [None] * len(items)
+    tasks = queue.Queue()
+    for i, item in enumerate(items):
+        tasks.put((i, item))
+
+    def work():
+        while True:
+            try:
+                i, item = tasks.get_nowait()
+            except queue.Empty:
+                return
+
+            try:
+                results[i] = func(item)
+            except Exception as e:
+                results[i] = e
+
+    threads = [threading.Thread(target=work) for _i in range(max(1, min(workers, len(items))))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return results
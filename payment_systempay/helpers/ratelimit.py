@@ -0,0 +1,45 @@
+# coding: utf-8
+#
+# Copyright © Lyra Network.
+# This file is part of Systempay plugin for Odoo. See COPYING.md for license details.
+#
+# Author:    Lyra Network (https://www.lyra.com)
+# Copyright: Copyright © Lyra Network
+# License:   http://www.gnu.org/licenses/agpl.html GNU Affero General Public License (AGPL v3)
+
+import threading
+import time
+
+from .cache import LRUCache
+
+class TokenBucketLimiter(object):
+    """Per-key token buckets holding up to burst tokens, refilled at rate tokens per second.
+
+    Only the most recently seen keys are tracked, so memory stays bounded whatever the number of clients.
+    """
+
+    def __init__(self, rate, burst, size=10000):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._buckets = LRUCache(size)
+        self._lock = threading.Lock()
+
+    def _refill(self, key, now):
+        tokens, last = self._buckets.get(key, (self.burst, now))
+        return min(self.burst, tokens + (now - last) * self.rate)
+
+    def allowed(self, key):
+        with self._lock:
+            return self._refill(key, time.time()) >= 1
+
+    def consume(self, key):
+        # Take a token, return False if there was none left.
+        with self._lock:
+            now = time.time()
+            tokens = self._refill(key, now)
+            if tokens < 1:
+                self._buckets.set(key, (tokens, now))
+                return False
+
+            self._buckets.set(key, (tokens - 1, now))
+            return True
@@ -0,0 +1,76 @@
+# coding: utf-8
+#
+# Copyright © Lyra Network.
+# This file is part of Systempay plugin for Odoo. See COPYING.md for license details.
+#
+# Author:    Lyra Network (https://www.lyra.com)
+# Copyright: Copyright © Lyra Network
+# License:   http://www.gnu.org/licenses/agpl.html GNU Affero General Public License (AGPL v3)
+
+import csv
+import io
+import itertools
+
+# Default columns of the transaction export file, may be overridden.
+EXPORT_COLUMNS = {
+    'reference': 'order_id',
+    'uuid': 'trans_uuid',
+    'amount': 'amount',
+    'currency': 'currency',
+    'status': 'status',
+}
+
+def read_lines(file, chunk_size):
+    """Yield the header line then lists of at most chunk_size raw lines of an export file.
+
+    Export values must not contain line breaks.
+    """
+
+    header = file.readline()
+    yield header
+
+    while True:
+        lines = list(itertools.islice(file, chunk_size))
+        if not lines:
+            break
+
+        yield lines
+
+def parse_lines(header, lines, columns, delimiter=','):
+    # Top level function so it can be run in a worker process.
+    rows = []
+    names = next(csv.reader([header], delimiter=delimiter))
+    for values in csv.reader(lines, delimiter=delimiter):
+        if not values:
+            continue
+
+        record = dict(zip(names, values))
+        rows.append(dict((k, (record.get(column) or '').strip()) for k, column in columns.items()))
+
+    return rows
+
+def parse_chunks(file, columns, chunk_size=10000, pool=None, window=4, delimiter=','):
+    """Yield lists of parsed rows of an export file, keeping memory bounded.
+
+    With a multiprocessing pool, at most window chunks are parsed at a time and chunks are yielded in file order.
+    """
+
+    chunks = read_lines(file, chunk_size)
+    header = next(chunks, '')
+
+    if pool is None:
+        for lines in chunks:
+            yield parse_lines(header, lines, columns, delimiter)
+        return
+
+    pending = []
+    for lines in chunks:
+        pending.append(pool.apply_async(parse_lines, (header, lines, columns, delimiter)))
+        if len(pending) >= window:
+            yield pending.pop(0).get()
+
+    for result in pending:
+        yield result.get()
+
+def open_export(filename, encoding='utf-8'):
+    return io.open(filename, 'r', encoding=encoding, newline='')
@@ -0,0 +1,58 @@
+# coding: utf-8
+#
+# Copyright © Lyra Network.
+# This file is part of Systempay plugin for Odoo. See COPYING.md for license details.
+#
+# Author:    Lyra Network (https://www.lyra.com)
+# Copyright: Copyright © Lyra Network
+# License:   http://www.gnu.org/licenses/agpl.html GNU Affero General Public License (AGPL v3)
+
+import base64
+from hashlib import sha1, sha256
+import hmac
+
+class SystempaySigner(object):
+    """Compute and check Systempay form signatures for one key and algorithm.
+
+    Key material is encoded once and, for HMAC-SHA-256, a pre-keyed HMAC object is kept and copied for each
+    signature, so instances are meant to be built once per acquirer and context mode then reused.
+    """
+
+    def __init__(self, key, algo):
+        self.algo = algo
+        self._key = (key or '').encode('utf-8')
+        self._hmac = hmac.new(self._key, digestmod=sha256) if algo != 'SHA-1' else None
+
+    def payload(self, values):
+        # Values of vads_* fields sorted by field name, each one followed by a '+', then the key.
+        parts = [values[k] for k in sorted(values) if k.startswith('vads_')]
+        parts.append('')
+
+        return u'+'.join(parts).encode('utf-8') + self._key
+
+    def sign(self, values):
+        payload = self.payload(values)
+
+        if self._hmac is None:
+            return sha1(payload).hexdigest()
+
+        mac = self._hmac.copy()
+        mac.update(payload)
+        return base64.b64encode(mac.digest()).decode('utf-8')
+
+    def sign_many(self, values_list):
+        return [self.sign(values) for values in values_list]
+
+    def verify(self, values, signature):
+        if not signature:
+            return False
+
+        expected = self.sign(values)
+        if self._hmac is None:
+            # Hexadecimal digest, case does not matter.
+            signature = signature.lower()
+
+        try:
+            return hmac.compare_digest(expected.encode('utf-8'), signature.encode('utf-8'))
+        except (TypeError, UnicodeError):
+            return False
@@ -7,16 +7,94 @@
 # Copyright: Copyright © Lyra Network
 # License:   http://www.gnu.org/licenses/agpl.html GNU Affero General Public License (AGPL v3)
 
-from odoo import _
+from collections import namedtuple
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
 
-from .constants import SYSTEMPAY_CURRENCIES
+from .constants import SYSTEMPAY_CURRENCIES, SYSTEMPAY_STATUSES
+
+SystempayCurrency = namedtuple('SystempayCurrency', ['alpha', 'num', 'exponent'])
+
+# Supported currencies indexed by ISO 4217 alphabetic and numeric codes, built once at import.
+_CURRENCIES_BY_ALPHA = dict((c[0], SystempayCurrency(*c)) for c in SYSTEMPAY_CURRENCIES)
+_CURRENCIES_BY_NUM = dict((c.num, c) for c in _CURRENCIES_BY_ALPHA.values())
+
+def get_currency(iso):
+    return _CURRENCIES_BY_ALPHA.get(iso)
+
+def get_currency_by_num(num):
+    return _CURRENCIES_BY_NUM.get(str(num).zfill(3)) if num is not None else None
 
 def find_currency(iso):
-    for currency in SYSTEMPAY_CURRENCIES:
-        if currency[0] == iso:
-            return currency[1];
+    currency = _CURRENCIES_BY_ALPHA.get(iso)
+    return currency.num if currency else None
+
+def to_minor_units(amount, decimals):
+    # Round half up on the shortest decimal representation of amount, so result does not depend on float noise.
+    value = Decimal(repr(float(amount))).scaleb(int(decimals))
+    return int(value.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+def from_minor_units(minor, decimals):
+    return float(Decimal(int(minor)).scaleb(-int(decimals)))
+
+def same_amount(minor, amount, decimals):
+    try:
+        return int(minor) == to_minor_units(amount, decimals)
+    except (TypeError, ValueError):
+        return False
+
+_TX_STATES = {'success': 'done', 'pending': 'pending', 'cancel': 'cancel'}
+_TX_STATE_BY_STATUS = dict((status, _TX_STATES[k]) for k, statuses in SYSTEMPAY_STATUSES.items() for status in statuses)
+
+def get_tx_state(status):
+    # Odoo transaction state matching a gateway transaction status.
+    return _TX_STATE_BY_STATUS.get(status, 'error')
+
+def installment_schedule(amount, first, count, period, start):
+    """List of (sequence, date, amount in minor units) of a payment in installments.
+
+    First payment is first, others share the rest equally, last one getting the rounding remainder.
+    """
+
+    count = max(1, int(count))
+    if count == 1:
+        return [(1, start, amount)]
+
+    others = (amount - first) // (count - 1)
+    schedule = [(1, start, first)]
+    for i in range(1, count):
+        value = others if i < count - 1 else amount - first - others * (count - 2)
+        schedule.append((i + 1, start + timedelta(days=int(period) * i), value))
+
+    return schedule
+
+def seed_codes(env, table, labels):
+    """Insert (code, label) rows missing from table with one query, existing codes being read with another."""
+
+    env.cr.execute('SELECT code FROM {}'.format(table))
+    existing = set(row[0] for row in env.cr.fetchall())
+
+    missing = [(code, label) for code, label in sorted(labels.items()) if code not in existing]
+    if not missing:
+        return 0
+
+    row = '(%s, %s, %s, %s, now() at time zone \'UTC\', now() at time zone \'UTC\')'
+    params = []
+    for code, label in missing:
+        params.extend([code, label, env.uid, env.uid])
+
+    env.cr.execute(
+        'INSERT INTO {} (code, label, create_uid, write_uid, create_date, write_date) VALUES {}'.format(table, ', '.join([row] * len(missing))),
+        params
+    )
+
+    return len(missing)
 
-    return None
+def env_lang(env):
+    # Language of an Odoo environment, the one of its user if not set in context.
+    return env.context.get('lang') or env.user.lang or 'en_US'
 
 def lang_translate(callback, v):
+    # Only module depending on Odoo, imported when called to keep helpers usable without it.
+    from odoo import _
     return _(v)
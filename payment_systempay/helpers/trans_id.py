@@ -0,0 +1,49 @@
+# coding: utf-8
+#
+# Copyright © Lyra Network.
+# This file is part of Systempay plugin for Odoo. See COPYING.md for license details.
+#
+# Author:    Lyra Network (https://www.lyra.com)
+# Copyright: Copyright © Lyra Network
+# License:   http://www.gnu.org/licenses/agpl.html GNU Affero General Public License (AGPL v3)
+
+import threading
+
+# Gateway accepts transaction identifiers from 000000 to 899999, unique over a day in UTC.
+TRANS_ID_MAX = 899999
+
+class TimeTransIdAllocator(object):
+    """Number of 1/10 seconds since midnight. Not unique if two payments start in the same 1/10 second."""
+
+    def allocate(self, now):
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        return str(int((now - midnight).total_seconds() * 10)).rjust(6, '0')
+
+class BlockTransIdAllocator(object):
+    """Hand out identifiers from blocks reserved in a shared counter.
+
+    reserve(day, size) must atomically reserve size identifiers for day across all processes and return the first
+    one, from 0 to TRANS_ID_MAX. Identifiers are then handed out from memory until the block is used up or the day
+    changes.
+    """
+
+    def __init__(self, reserve, block_size=50):
+        self.reserve = reserve
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._day = None
+        self._next = 0
+        self._end = 0
+
+    def allocate(self, now):
+        day = now.strftime('%Y%m%d')
+
+        with self._lock:
+            if day != self._day or self._next >= self._end:
+                start = self.reserve(day, self.block_size)
+                self._day, self._next, self._end = day, start, min(start + self.block_size, TRANS_ID_MAX + 1)
+
+            trans_id = self._next
+            self._next += 1
+
+        return str(trans_id).rjust(6, '0')
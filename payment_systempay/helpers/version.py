@@ -0,0 +1,15 @@
+# coding: utf-8
+#
+# Copyright © Lyra Network.
+# This file is part of Systempay plugin for Odoo. See COPYING.md for license details.
+#
+# Author:    Lyra Network (https://www.lyra.com)
+# Copyright: Copyright © Lyra Network
+# License:   http://www.gnu.org/licenses/agpl.html GNU Affero General Public License (AGPL v3)
+
+import re
+
+def version_tuple(version):
+    # Major and minor numbers of a version string: '13.0' gives (13, 0), 'saas~12.3' gives (12, 3).
+    numbers = [int(n) for n in re.findall(r'\d+', version or '')[:2]]
+    return tuple(numbers + [0] * (2 - len(numbers)))
@@ -0,0 +1,139 @@
+# coding: utf-8
+#
+# Copyright © Lyra Network.
+# This file is part of Systempay plugin for Odoo. See COPYING.md for license details.
+#
+# Author:    Lyra Network (https://www.lyra.com)
+# Copyright: Copyright © Lyra Network
+# License:   http://www.gnu.org/licenses/agpl.html GNU Affero General Public License (AGPL v3)
+
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .constants import SYSTEMPAY_TO_VALIDATE_STATUSES
+from .tools import find_currency
+
+class WebServiceError(Exception):
+    pass
+
+class SystempayWebService(object):
+    """Client of the gateway REST web services, keeping connections alive in a bounded pool."""
+
+    RETRY_STATUSES = (429, 502, 503, 504)
+
+    def __init__(self, url, site_id, password, timeout=10, pool_size=10, retries=3, backoff=0.5):
+        self.url = url.rstrip('/') + '/'
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+
+        self.session = requests.Session()
+        self.session.auth = (site_id, password)
+        self.session.headers['Content-Type'] = 'application/json'
+
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def call(self, path, payload, retry=True):
+        """Post payload to path and return the answer. Timeouts, connection errors and busy gateway answers are retried,
+        unless retry is False for calls that are not idempotent.
+        """
+
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(self.url + path, json=payload, timeout=self.timeout)
+                if response.status_code not in self.RETRY_STATUSES:
+                    break
+
+                error = WebServiceError('HTTP {} on {}'.format(response.status_code, path))
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = WebServiceError('{} on {}'.format(e, path))
+
+            if not retry or attempt >= self.retries:
+                raise error
+
+            time.sleep(self.backoff * 2 ** attempt)
+            attempt += 1
+
+        if response.status_code != 200:
+            raise WebServiceError('HTTP {} on {}'.format(response.status_code, path))
+
+        result = response.json()
+        if result.get('status') != 'SUCCESS':
+            answer = result.get('answer') or {}
+            raise WebServiceError('{}: {}'.format(answer.get('errorCode'), answer.get('errorMessage')))
+
+        return result.get('answer') or {}
+
+    def get_transaction(self, uuid):
+        return self.call('V4/Transaction/Get', {'uuid': uuid})
+
+    def validate_transaction(self, uuid, comment=None):
+        """Validate transaction, without retry as a lost answer may hide a successful validation. After a failure, the
+        transaction is read again and returned if it is no longer waiting for validation.
+        """
+
+        payload = {'uuid': uuid}
+        if comment:
+            payload['comment'] = comment
+
+        try:
+            return self.call('V4/Transaction/Validate', payload, retry=False)
+        except WebServiceError as e:
+            error = e
+
+        try:
+            answer = self.get_transaction(uuid)
+        except WebServiceError:
+            raise error
+
+        if answer.get('detailedStatus') in SYSTEMPAY_TO_VALIDATE_STATUSES:
+            raise error
+
+        return answer
+
+_clients = {}
+_lock = threading.Lock()
+
+def get_client(url, site_id, password, **kwargs):
+    # One client per shop and process, so connections are reused between calls.
+    key = (url, site_id, password)
+    with _lock:
+        if key not in _clients:
+            _clients[key] = SystempayWebService(url, site_id, password, **kwargs)
+
+        return _clients[key]
+
+def transaction_data(answer):
+    """Gateway fields, as sent in notifications, of a web service transaction answer."""
+
+    card = (answer.get('transactionDetails') or {}).get('cardDetails') or {}
+    authorization = card.get('authorizationResponse') or {}
+
+    data = {
+        'vads_trans_uuid': answer.get('uuid'),
+        'vads_trans_status': answer.get('detailedStatus'),
+        'vads_order_id': (answer.get('orderDetails') or {}).get('orderId'),
+        'vads_amount': str(answer.get('amount', '')),
+        'vads_currency': find_currency(answer.get('currency')),
+        'vads_card_brand': card.get('effectiveBrand'),
+        'vads_card_number': card.get('pan'),
+        'vads_auth_result': authorization.get('authorizationResult'),
+        'vads_result': answer.get('errorCode') or '00',
+    }
+
+    if card.get('expiryMonth') and card.get('expiryYear'):
+        data['vads_expiry_month'] = str(card['expiryMonth'])
+        data['vads_expiry_year'] = str(card['expiryYear'])
+
+    threeds = (card.get('threeDSResponse') or {}).get('authenticationResultData') or {}
+    if threeds.get('enrolled') == 'Y' and threeds.get('status') == 'Y':
+        data['vads_threeds_status'] = 'Y'
+        data['vads_threeds_cavv'] = threeds.get('cavv') or ''
+
+    return dict((k, v) for k, v in data.items() if v is not None)
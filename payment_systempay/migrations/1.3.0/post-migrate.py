@@ -0,0 +1,62 @@
+# coding: utf-8
+#
+# Copyright © Lyra Network.
+# This file is part of Systempay plugin for Odoo. See COPYING.md for license details.
+#
+# Author:    Lyra Network (https://www.lyra.com)
+# Copyright: Copyright © Lyra Network
+# License:   http://www.gnu.org/licenses/agpl.html GNU Affero General Public License (AGPL v3)
+
+import logging
+
+import psycopg2
+
+from odoo.addons.payment_systempay.models.notification_log import encode_payload
+
+_logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 10000
+
+def migrate(cr, version):
+    """Move logs of previous versions from payment_transaction.systempay_raw_data to systempay_notification_log.
+
+    Rows are read through a server-side cursor and written in batches, so memory does not grow with history size.
+    """
+
+    if not version:
+        return
+
+    cr.execute(
+        'SELECT 1 FROM information_schema.columns '
+        'WHERE table_name = \'payment_transaction\' AND column_name = \'systempay_raw_data\''
+    )
+    if not cr.fetchone():
+        return
+
+    moved = 0
+    rows_cursor = cr._cnx.cursor('systempay_raw_data_migration')
+    try:
+        rows_cursor.itersize = BATCH_SIZE
+        rows_cursor.execute('SELECT id, systempay_raw_data FROM payment_transaction WHERE systempay_raw_data IS NOT NULL')
+        while True:
+            rows = rows_cursor.fetchmany(BATCH_SIZE)
+            if not rows:
+                break
+
+            # Old format is a Python dict representation, keep it as is.
+            params = []
+            for tx_id, raw in rows:
+                params.extend([tx_id, psycopg2.Binary(encode_payload({'raw': raw}))])
+
+            cr.execute(
+                'INSERT INTO systempay_notification_log (transaction_id, payload, create_date) VALUES '
+                + ', '.join(['(%s, %s, now() at time zone \'UTC\')'] * len(rows)),
+                params
+            )
+
+            moved += len(rows)
+            _logger.info('Systempay: %s transaction logs moved.', moved)
+    finally:
+        rows_cursor.close()
+
+    cr.execute('ALTER TABLE payment_transaction DROP COLUMN systempay_raw_data')
@@ -8,7 +8,7 @@
 # License:   http://www.gnu.org/licenses/agpl.html GNU Affero General Public License (AGPL v3)
 
 from odoo import models, fields
-from ..helpers import constants
+from ..helpers import constants, tools
 
 class SystempayCard(models.Model):
     _name = 'systempay.card'
@@ -19,11 +19,9 @@ class SystempayCard(models.Model):
     code = fields.Char()
     label = fields.Char()
 
-    def init(self):
-        cards = constants.SYSTEMPAY_CARDS
-
-        for c, l in cards.items():
-            card = self.search([('code', '=', c)])
+    _sql_constraints = [
+        ('code_uniq', 'unique(code)', 'Code must be unique.'),
+    ]
 
-            if not card:
-                self.create({'code': c, 'label': l})
+    def init(self):
+        tools.seed_codes(self.env, 'systempay_card', constants.SYSTEMPAY_CARDS)
@@ -0,0 +1,69 @@
+# coding: utf-8
+#
+# Copyright © Lyra Network.
+# This file is part of Systempay plugin for Odoo. See COPYING.md for license details.
+#
+# Author:    Lyra Network (https://www.lyra.com)
+# Copyright: Copyright © Lyra Network
+# License:   http://www.gnu.org/licenses/agpl.html GNU Affero General Public License (AGPL v3)
+
+from odoo import api, models, fields, _
+
+from ..helpers import tools
+
+class SystempayInstallment(models.Model):
+    _name = 'systempay.installment'
+    _description = 'Systempay installment'
+    _order = 'reference, sequence'
+
+    reference = fields.Char(required=True, readonly=True)
+    transaction_id = fields.Many2one('payment.transaction', readonly=True, index=True, ondelete='cascade')
+    sequence = fields.Integer(required=True, readonly=True)
+    expected_date = fields.Date(string=_('Expected date'), readonly=True)
+    amount = fields.Float(string=_('Amount'), readonly=True)
+    state = fields.Selection(string=_('Status'), selection=[('expected', _('Expected')), ('pending', _('Pending')), ('paid', _('Paid')), ('failed', _('Failed'))], default='expected', readonly=True)
+    trans_uuid = fields.Char(string=_('Transaction ID'), readonly=True)
+    trans_status = fields.Char(string=_('Transaction status'), readonly=True)
+
+    _sql_constraints = [
+        ('reference_sequence_uniq', 'unique(reference, sequence)', 'Only one installment per sequence number.'),
+    ]
+
+    _states = {'done': 'paid', 'pending': 'pending', 'cancel': 'failed', 'error': 'failed'}
+
+    def init(self):
+        # Outstanding installments reports.
+        self.env.cr.execute(
+            'CREATE INDEX IF NOT EXISTS systempay_installment_state_date_idx ON systempay_installment (state, expected_date)'
+        )
+
+    @api.model
+    def _set_schedule(self, reference, schedule, decimals):
+        """Store expected installments of a payment with one query, replacing those of a previous form generation."""
+
+        self.env.cr.execute('DELETE FROM systempay_installment WHERE reference = %s AND state = \'expected\'', (reference,))
+
+        row = '(%s, (SELECT id FROM payment_transaction WHERE reference = %s), %s, %s, %s, \'expected\', %s, %s, now() at time zone \'UTC\', now() at time zone \'UTC\')'
+        params = []
+        for sequence, date, amount in schedule:
+            params.extend([reference, reference, sequence, date, tools.from_minor_units(amount, decimals), self.env.uid, self.env.uid])
+
+        self.env.cr.execute(
+            'INSERT INTO systempay_installment (reference, transaction_id, sequence, expected_date, amount, state, create_uid, write_uid, create_date, write_date) '
+            'VALUES ' + ', '.join([row] * len(schedule)) + ' ON CONFLICT (reference, sequence) DO NOTHING',
+            params
+        )
+
+    @api.model
+    def _match(self, tx, data):
+        """Update the installment of a notification, found by reference and sequence number."""
+
+        state = self._states[tools.get_tx_state(data.get('vads_trans_status'))]
+        self.env.cr.execute(
+            'UPDATE systempay_installment SET state = %s, trans_uuid = %s, trans_status = %s, transaction_id = %s, '
+            'write_uid = %s, write_date = now() at time zone \'UTC\' WHERE reference = %s AND sequence = %s',
+            (state, data.get('vads_trans_uuid'), data.get('vads_trans_status'), tx.id, self.env.uid, tx.reference, int(data.get('vads_sequence_number') or 1))
+        )
+        self.invalidate_cache()
+
+        return self.env.cr.rowcount
@@ -7,7 +7,8 @@
 # Copyright: Copyright © Lyra Network
 # License:   http://www.gnu.org/licenses/agpl.html GNU Affero General Public License (AGPL v3)
 
-from odoo import models, fields
+from odoo import api, models, fields
+from odoo.tools import ormcache
 from ..helpers import constants, tools
 
 class SystempayLanguage(models.Model):
@@ -19,11 +20,20 @@ class SystempayLanguage(models.Model):
     code = fields.Char()
     label = fields.Char(translate=tools.lang_translate)
 
-    def init(self):
-        languages = constants.SYSTEMPAY_LANGUAGES
+    _sql_constraints = [
+        ('code_uniq', 'unique(code)', 'Code must be unique.'),
+    ]
+
+    def name_get(self):
+        labels = self._get_labels(tools.env_lang(self.env))
+        return [(language.id, labels.get(language.code, language.code)) for language in self]
 
-        for c, l in languages.items():
-            lang = self.search([('code', '=', c)])
+    @api.model
+    @ormcache('lang')
+    def _get_labels(self, lang):
+        # Translated labels by code, cached per language. Odoo clears caches when translations are loaded.
+        translation = self.env['ir.translation']
+        return dict((code, translation._get_source(None, ('code',), lang, label)) for code, label in constants.SYSTEMPAY_LANGUAGES.items())
 
-            if not lang:
-                self.create({'code': c, 'label': l})
+    def init(self):
+        tools.seed_codes(self.env, 'systempay_language', constants.SYSTEMPAY_LANGUAGES)
@@ -0,0 +1,81 @@
+# coding: utf-8
+#
+# Copyright © Lyra Network.
+# This file is part of Systempay plugin for Odoo. See COPYING.md for license details.
+#
+# Author:    Lyra Network (https://www.lyra.com)
+# Copyright: Copyright © Lyra Network
+# License:   http://www.gnu.org/licenses/agpl.html GNU Affero General Public License (AGPL v3)
+
+from odoo import api, models, fields
+
+from ..helpers.cache import LRUCache
+
+# Results of already applied notifications, per database.
+_applied = LRUCache(4096)
+
+class SystempayNotificationKey(models.Model):
+    _name = 'systempay.notification.key'
+    _description = 'Systempay applied notification'
+    _log_access = False
+
+    key = fields.Char(required=True, readonly=True)
+    transaction_id = fields.Many2one('payment.transaction', readonly=True, ondelete='cascade')
+    result = fields.Boolean(readonly=True)
+    create_date = fields.Datetime(readonly=True, default=fields.Datetime.now)
+
+    _sql_constraints = [
+        ('key_uniq', 'unique(key)', 'Notification already applied.'),
+    ]
+
+    @api.model
+    def _make_key(self, data):
+        uuid, status = data.get('vads_trans_uuid'), data.get('vads_trans_status')
+        if not uuid or not status:
+            return None
+
+        # Sequence number distinguishes installments of a same payment.
+        return u'{}:{}:{}'.format(uuid, status, data.get('vads_sequence_number') or '1')
+
+    @api.model
+    def _get_result(self, key, fresh=False):
+        """Return result of the notification identified by key if it has already been applied, None otherwise.
+
+        With fresh, read in a new database transaction to see notifications committed after the current one started.
+        """
+
+        cache_key = (self.env.cr.dbname, key)
+        result = _applied.get(cache_key)
+        if result is not None:
+            return result
+
+        query = 'SELECT result FROM systempay_notification_key WHERE key = %s'
+        if fresh:
+            with self.pool.cursor() as cr:
+                cr.execute(query, (key,))
+                row = cr.fetchone()
+        else:
+            self.env.cr.execute(query, (key,))
+            row = self.env.cr.fetchone()
+
+        if not row:
+            return None
+
+        # A row read in the current transaction may have been written by it: cache it once committed only.
+        result = bool(row[0])
+        if fresh:
+            _applied.set(cache_key, result)
+        else:
+            self.env.cr.after('commit', lambda: _applied.set(cache_key, result))
+
+        return result
+
+    @api.model
+    def _set_result(self, key, tx, result):
+        self.env.cr.execute(
+            'INSERT INTO systempay_notification_key (key, transaction_id, result, create_date) '
+            'VALUES (%s, %s, %s, now() at time zone \'UTC\') ON CONFLICT (key) DO NOTHING',
+            (key, tx.id or None, bool(result))
+        )
+
+        # Not cached here, a savepoint may still roll the row back. _get_result caches rows read back.
@@ -0,0 +1,87 @@
+# coding: utf-8
+#
+# Copyright © Lyra Network.
+# This file is part of Systempay plugin for Odoo. See COPYING.md for license details.
+#
+# Author:    Lyra Network (https://www.lyra.com)
+# Copyright: Copyright © Lyra Network
+# License:   http://www.gnu.org/licenses/agpl.html GNU Affero General Public License (AGPL v3)
+
+import json
+import logging
+import zlib
+
+from odoo import api, models, fields
+
+_logger = logging.getLogger(__name__)
+
+def encode_payload(data):
+    # Compressed canonical JSON, stored as is in the bytea column. Also used by migrations.
+    dump = json.dumps(data, sort_keys=True, separators=(',', ':'))
+    return zlib.compress(dump.encode('utf-8'), 6)
+
+class SystempayNotificationLog(models.Model):
+    _name = 'systempay.notification.log'
+    _description = 'Systempay notification log'
+    _order = 'id desc'
+
+    transaction_id = fields.Many2one('payment.transaction', readonly=True, index=True, ondelete='cascade')
+    trans_uuid = fields.Char(readonly=True)
+    trans_status = fields.Char(readonly=True)
+    payload = fields.Binary(attachment=False, readonly=True)
+
+    _retention_days = 365
+    _batch_size = 10000
+
+    def init(self):
+        self.env.cr.execute('CREATE INDEX IF NOT EXISTS systempay_notification_log_create_date_idx ON systempay_notification_log (create_date)')
+
+    @api.model
+    def _encode(self, data):
+        return encode_payload(data)
+
+    @api.model
+    def _decode(self, payload):
+        if not payload:
+            return {}
+
+        return json.loads(zlib.decompress(bytes(payload)).decode('utf-8'))
+
+    @api.model
+    def _append(self, tx, data):
+        return self.sudo().create({
+            'transaction_id': tx.id,
+            'trans_uuid': data.get('vads_trans_uuid'),
+            'trans_status': data.get('vads_trans_status'),
+            'payload': self._encode(data),
+        })
+
+    def get_data(self):
+        self.ensure_one()
+        return self._decode(self.payload)
+
+    @api.model
+    def _cron_purge(self, days=None):
+        """Delete notifications older than the retention period, except the last one of each transaction."""
+
+        params = self.env['ir.config_parameter'].sudo()
+        days = days or int(params.get_param('payment_systempay.notification_log_days', self._retention_days))
+
+        while True:
+            self.env.cr.execute(
+                'DELETE FROM systempay_notification_log WHERE id IN ('
+                '    SELECT l.id FROM systempay_notification_log l'
+                '    WHERE l.create_date < (now() at time zone \'UTC\') - %s * interval \'1 day\''
+                '    AND EXISTS (SELECT 1 FROM systempay_notification_log n WHERE n.transaction_id = l.transaction_id AND n.id > l.id)'
+                '    LIMIT %s'
+                ')',
+                (days, self._batch_size)
+            )
+            count = self.env.cr.rowcount
+            self.env.cr.commit()
+
+            _logger.info('Systempay: %s notification logs purged.', count)
+            if count < self._batch_size:
+                break
+
+        return True
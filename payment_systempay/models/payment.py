@@ -7,26 +7,33 @@
 # Copyright: Copyright © Lyra Network
 # License:   http://www.gnu.org/licenses/agpl.html GNU Affero General Public License (AGPL v3)
 
-import base64
+from collections import namedtuple
 from datetime import datetime
-from hashlib import sha1, sha256
-import hmac
+import json
 import logging
-import math
 from os import path
-
-from pkg_resources import parse_version
+import time
 
 from odoo import models, api, release, fields, _
 from odoo.addons.payment.models.payment_acquirer import ValidationError
-from odoo.tools import convert_xml_import
-from odoo.tools import float_round
-from odoo.tools.float_utils import float_compare
+from odoo.tools import convert_xml_import, ormcache
 
 from ..controllers.main import SystempayController
-from ..helpers import constants, tools
+from ..helpers import constants, form, log, tools
+from ..helpers.pool import run_bounded
+from ..helpers.version import version_tuple
+from ..helpers.webservice import get_client, transaction_data
+from ..helpers.cache import LRUCache
+from ..helpers.metrics import metrics
+from ..helpers.signer import SystempaySigner
 from .card import SystempayCard
+from .installment import SystempayInstallment
 from .language import SystempayLanguage
+from .notification import SystempayNotificationKey
+from .notification_log import SystempayNotificationLog
+from .queue import SystempayIpnQueue
+from .stat import SystempayStat
+from .trans_id import SystempayTransIdBlock
 
 
 try:
@@ -36,6 +43,20 @@ except ImportError:
 
 _logger = logging.getLogger(__name__)
 
+# First key of PostgreSQL advisory locks taken on order references by this module.
+_LOCK_NAMESPACE = 0x53595350
+
+_LOCK_TRY_QUERY = (
+    'SELECT bool_and(locked) FROM '
+    '(SELECT pg_try_advisory_xact_lock(%s, hashtext(r)) AS locked FROM unnest(%s::text[]) AS r ORDER BY hashtext(r)) t'
+)
+
+# Signed payment forms by database, acquirer and reference, see _systempay_cached_form.
+_forms = LRUCache(1024)
+
+# Acquirer found from shop ID and context mode of a notification, with the signer of its key.
+SystempayRoute = namedtuple('SystempayRoute', ('acquirer_id', 'company_id', 'signer'))
+
 class AcquirerSystempay(models.Model):
     _inherit = 'payment.acquirer'
 
@@ -44,8 +65,14 @@ class AcquirerSystempay(models.Model):
         return urlparse.urljoin(base_url, SystempayController._notify_url)
 
     def _get_languages(self):
-        languages = constants.SYSTEMPAY_LANGUAGES
-        return [(c, _(l)) for c, l in languages.items()]
+        return list(self._systempay_languages(tools.env_lang(self.env)))
+
+    @api.model
+    @ormcache('lang')
+    def _systempay_languages(self, lang):
+        # Cached per language, Odoo clears caches when translations are loaded.
+        translation = self.env['ir.translation']
+        return tuple((c, translation._get_source(None, ('code',), lang, l)) for c, l in constants.SYSTEMPAY_LANGUAGES.items())
 
     @api.depends('provider')
     def _compute_multi_warning(self):
@@ -83,16 +110,20 @@ class AcquirerSystempay(models.Model):
     systempay_redirect_error_message = fields.Char(string=_('Redirection message on failure'), help=_('Message displayed on the payment page prior to redirection after a declined payment.'), default=_('Redirection to shop in a few seconds...'))
     systempay_return_mode = fields.Selection(string=_('Return mode'), help=_('Method that will be used for transmitting the payment result from the payment page to your shop.'), selection=[('GET', 'GET'), ('POST', 'POST')])
     systempay_multi_warning = fields.Boolean(compute='_compute_multi_warning')
+    systempay_ws_url = fields.Char(string=_('REST API URL'), help=_('Base URL of the gateway web services.'), default=constants.SYSTEMPAY_PARAMS.get('WS_URL'))
+    systempay_ws_password_test = fields.Char(string=_('REST API test password'), help=_('REST API password for test mode (available in Systempay Back Office).'), groups='base.group_system')
+    systempay_ws_password_prod = fields.Char(string=_('REST API production password'), help=_('REST API password for production mode (available in Systempay Back Office).'), groups='base.group_system')
+    systempay_ipn_mode = fields.Selection(string=_('IPN processing'), help=_('If queued is selected, notifications are checked and stored immediately then applied to orders in background.'), selection=[('direct', _('Direct')), ('queued', _('Queued'))], default='direct')
 
     systempay_multi_count = fields.Char(string=_('Count'), help=_('Total number of payments.'))
     systempay_multi_period = fields.Char(string=_('Period'), help=_('Delay (in days) between payments.'))
     systempay_multi_first = fields.Char(string=_('1st payment'), help=_('Amount of first payment, in percentage of total amount. If empty, all payments will have the same amount.'))
 
     # Check if it's Odoo 10.
-    systempay_odoo10 = True if parse_version(release.version) < parse_version('11') else False
+    systempay_odoo10 = version_tuple(release.version) < (11, 0)
 
     # Compatibility betwen Odoo 13 and previous versions.
-    systempay_odoo13 = True if parse_version(release.version) >= parse_version('13') else False
+    systempay_odoo13 = version_tuple(release.version) >= (13, 0)
 
     if systempay_odoo13:
         image = fields.Char()
@@ -110,50 +141,207 @@ class AcquirerSystempay(models.Model):
 
         return None
 
+    @api.model
+    def cron_add(self, filename):
+        # Scheduled and server actions format changed in Odoo 11.
+        if self.systempay_odoo10:
+            filename = filename.replace('.xml', '_odoo10.xml')
+
+        file = path.join(path.dirname(path.dirname(path.abspath(__file__)))) + filename
+        convert_xml_import(self._cr, 'payment_systempay', file)
+
+        return None
+
     def _get_ctx_mode(self):
         ctx_key = self.state if self.systempay_odoo13 else self.environment
         ctx_value = 'TEST' if ctx_key == 'test' else 'PRODUCTION'
 
         return ctx_value
 
-    def _systempay_generate_sign(self, acquirer, values):
-        key = self.systempay_key_prod if self._get_ctx_mode() == 'PRODUCTION' else self.systempay_key_test
+    _systempay_cached_fields = ('provider', 'state', 'environment', 'company_id')
+
+    @api.model
+    def create(self, vals):
+        res = super(AcquirerSystempay, self).create(vals)
+        self.clear_caches()
 
-        sign = ''
-        for k in sorted(values.keys()):
-            if k.startswith('vads_'):
-                sign += values[k] + '+'
+        return res
 
-        sign += key
+    def write(self, vals):
+        res = super(AcquirerSystempay, self).write(vals)
 
-        if self.systempay_sign_algo == 'SHA-1':
-            shasign = sha1(sign.encode('utf-8')).hexdigest()
-        else:
-            shasign = base64.b64encode(hmac.new(key.encode('utf-8'), sign.encode('utf-8'), sha256).digest()).decode('utf-8')
+        # Drop cached signers, routes and form values if acquirer settings changed.
+        if any(f.startswith('systempay_') or f in self._systempay_cached_fields for f in vals):
+            self.clear_caches()
+
+        return res
+
+    def unlink(self):
+        res = super(AcquirerSystempay, self).unlink()
+        self.clear_caches()
+
+        return res
 
-        return shasign
+    @ormcache()
+    def _systempay_routes(self):
+        """Routes of Systempay acquirers by shop ID and context mode."""
+
+        routes = {}
+        for acquirer in self.sudo().search([('provider', 'in', ('systempay', 'systempaymulti'))]):
+            ctx_mode = acquirer._get_ctx_mode()
+            route = SystempayRoute(acquirer.id, acquirer.company_id.id, self._systempay_signer(acquirer.id, ctx_mode))
+            routes.setdefault((acquirer.systempay_site_id, ctx_mode), []).append(route)
+
+        return routes
+
+    @api.model
+    def _systempay_route(self, data):
+        """Route of the acquirer whose key signed this notification, None if there is none.
+
+        Only acquirers of the notification shop ID and context mode are tried, without querying the database once
+        routes are cached. Acquirers of the same shop share their key, so the one found may not be the acquirer of the
+        transaction.
+        """
+
+        shasign = data.get('signature')
+        for route in self._systempay_routes().get((data.get('vads_site_id'), data.get('vads_ctx_mode')), ()):
+            if route.signer.verify(data, shasign):
+                return route
+
+        return None
+
+    @ormcache('acquirer_id', 'ctx_mode')
+    def _systempay_signer(self, acquirer_id, ctx_mode):
+        acquirer = self.browse(acquirer_id)
+        key = acquirer.systempay_key_prod if ctx_mode == 'PRODUCTION' else acquirer.systempay_key_test
+
+        return SystempaySigner(key, acquirer.systempay_sign_algo)
+
+    def _systempay_get_signer(self):
+        self.ensure_one()
+        return self._systempay_signer(self.id, self._get_ctx_mode())
+
+    def _systempay_get_ws(self):
+        self.ensure_one()
+
+        # Passwords are readable by administrators only.
+        acquirer = self.sudo()
+        ctx_mode = acquirer._get_ctx_mode()
+        password = acquirer.systempay_ws_password_prod if ctx_mode == 'PRODUCTION' else acquirer.systempay_ws_password_test
+        if not password:
+            raise ValidationError(_('REST API password is not set for {}.').format(self.name))
+
+        params = self.env['ir.config_parameter'].sudo()
+        return get_client(
+            self.systempay_ws_url or constants.SYSTEMPAY_PARAMS.get('WS_URL'), self.systempay_site_id, password,
+            timeout=float(params.get_param('payment_systempay.ws_timeout', 10)),
+            pool_size=int(params.get_param('payment_systempay.ws_workers', 4))
+        )
+
+    def _systempay_generate_sign(self, acquirer, values):
+        return self._systempay_get_signer().sign(values)
+
+    def _systempay_multi_first(self, amount):
+        if (self.systempay_multi_first):
+            return int(float(self.systempay_multi_first) / 100 * int(amount))
+
+        return int(float(amount) / float(self.systempay_multi_count))
 
     def _get_payment_config(self, amount):
         if self.provider == 'systempaymulti':
-            if (self.systempay_multi_first):
-                first = int(float(self.systempay_multi_first) / 100 * int(amount))
-            else:
-                first = int(float(amount) / float(self.systempay_multi_count))
-
-            payment_config = u'MULTI:first=' + str(first) + u';count=' + self.systempay_multi_count + u';period=' + self.systempay_multi_period
+            first = self._systempay_multi_first(amount)
+            payment_config = form.multi_payment_config(first, self.systempay_multi_count, self.systempay_multi_period)
         else:
             payment_config = u'SINGLE'
 
         return payment_config
 
+    @ormcache('acquirer_id', 'ctx_mode', 'base_url')
+    def _systempay_static_values(self, acquirer_id, ctx_mode, base_url):
+        """Form fields depending only on acquirer configuration. Returned dict is shared, do not modify it."""
+
+        acquirer = self.browse(acquirer_id)
+
+        # List of available languages.
+        available_languages = ''.join(value.code + ';' for value in acquirer.systempay_available_languages)
+
+        # List of available payment cards.
+        payment_cards = ''.join(value.code + ';' for value in acquirer.systempay_payment_cards)
+
+        #Validation mode
+        validation_mode = acquirer.systempay_validation_mode if acquirer.systempay_validation_mode != '-1' else ''
+
+        static_values = {
+            'vads_site_id': acquirer.systempay_site_id,
+            'vads_ctx_mode': str(ctx_mode),
+            'vads_page_action': u'PAYMENT',
+            'vads_action_mode': u'INTERACTIVE',
+            'vads_version': constants.SYSTEMPAY_PARAMS.get('GATEWAY_VERSION'),
+            'vads_url_return': urlparse.urljoin(base_url, SystempayController._return_url),
+            'vads_contrib': constants.SYSTEMPAY_PARAMS.get('CMS_IDENTIFIER') + u'_' + constants.SYSTEMPAY_PARAMS.get('PLUGIN_VERSION') + u'/' + release.version,
+
+            'vads_language': acquirer.systempay_language or '',
+            'vads_available_languages': available_languages,
+            'vads_capture_delay': acquirer.systempay_capture_delay or '',
+            'vads_validation_mode': validation_mode,
+            'vads_payment_cards': payment_cards,
+            'vads_return_mode': str(acquirer.systempay_return_mode),
+        }
+
+        # Enable redirection?
+        if str(acquirer.systempay_redirect_enabled) == '1':
+            static_values.update({
+                'vads_redirect_success_timeout': acquirer.systempay_redirect_success_timeout or '',
+                'vads_redirect_success_message': acquirer.systempay_redirect_success_message or '',
+                'vads_redirect_error_timeout': acquirer.systempay_redirect_error_timeout or '',
+                'vads_redirect_error_message': acquirer.systempay_redirect_error_message or ''
+            })
+
+        return form.clean_values(static_values)
+
     def systempay_form_generate_values(self, values):
+        with metrics.timer('systempay_stage_seconds', stage='form'):
+            return self._systempay_cached_form(values)
+
+    def _systempay_cached_form(self, values):
+        """Signed form of a payment, reused while its reference, amount, currency, customer and acquirer settings do
+        not change, for payment_systempay.form_ttl seconds after its vads_trans_date.
+
+        Page reloads and new clicks on pay then send the same transaction to the gateway. Forms are cached per process.
+        """
+
+        ttl = int(self.env['ir.config_parameter'].sudo().get_param('payment_systempay.form_ttl', 600))
+        if ttl <= 0 or not values.get('reference'):
+            return self._systempay_form_generate_values(values)
+
+        key = (self.env.cr.dbname, self.id, values.get('reference'))
+        fingerprint = (
+            self.write_date, self.env['ir.config_parameter'].get_param('web.base.url'), values['amount'],
+            values['currency'].name, tuple(sorted(form.order_fields(values).items()))
+        )
+
+        cached = _forms.get(key)
+        if cached is not None and cached[0] == fingerprint and cached[1] > time.time():
+            metrics.inc('systempay_form_cache_total', result='hit')
+            self.systempay_redirect = cached[3]
+            return dict(cached[2])
+
+        metrics.inc('systempay_form_cache_total', result='miss')
+        tx_values = self._systempay_form_generate_values(values)
+
+        trans_date = datetime.strptime(tx_values['vads_trans_date'].decode('utf-8'), '%Y%m%d%H%M%S')
+        expires = time.time() + ttl - (datetime.utcnow() - trans_date).total_seconds()
+        _forms.set(key, (fingerprint, expires, dict(tx_values), self.systempay_redirect))
+
+        return tx_values
+
+    def _systempay_form_generate_values(self, values):
         base_url = self.env['ir.config_parameter'].get_param('web.base.url')
+        static_values = self._systempay_static_values(self.id, self._get_ctx_mode(), base_url)
 
-        # trans_id is the number of 1/10 seconds from midnight.
-        now = datetime.now()
-        midnight = now.replace(hour = 0, minute = 0, second = 0, microsecond = 0)
-        delta = int((now - midnight).total_seconds() * 10)
-        trans_id = str(delta).rjust(6, '0')
+        # trans_id is unique over the day in UTC, same time is used for trans_date.
+        now = datetime.utcnow()
+        trans_id = self.env['systempay.trans.id.block'].sudo().allocate(now)
 
         threeds_mpi = u''
         if self.systempay_threeds_min_amount and float(self.systempay_threeds_min_amount) > values['amount']:
@@ -162,92 +350,36 @@ class AcquirerSystempay(models.Model):
         # Check currency.
         currency_num = tools.find_currency(values['currency'].name)
         if currency_num is None:
-            _logger.error('The plugin cannot find a numeric code for the current shop currency {}.'.format(values['currency'].name))
+            _logger.error('The plugin cannot find a numeric code for the current shop currency %s.', values['currency'].name)
             raise ValidationError(_('The shop currency {} is not supported.').format(values['currency'].name))
 
         # Amount in cents.
-        k = int(values['currency'].decimal_places)
-        amount = int(float_round(float_round(values['amount'], k) * (10 ** k), 0))
-
-        # List of available languages.
-        available_languages = ''
-        for value in self.systempay_available_languages:
-            available_languages += value.code + ';'
-
-        # List of available payment cards.
-        payment_cards = ''
-        for value in self.systempay_payment_cards:
-            payment_cards += value.code + ';'
-
-        #Validation mode
-        validation_mode = self.systempay_validation_mode if self.systempay_validation_mode != '-1' else ''
+        amount = tools.to_minor_units(values['amount'], values['currency'].decimal_places)
 
         # Enable redirection?
-        self.systempay_redirect = True if str(self.systempay_redirect_enabled) == '1' else False
+        self.systempay_redirect = 'vads_redirect_success_timeout' in static_values
 
-        tx_values = dict() # Values to sign in unicode.
+        tx_values = dict(static_values) # Values to sign in unicode.
         tx_values.update({
-            'vads_site_id': self.systempay_site_id,
             'vads_amount': str(amount),
             'vads_currency': currency_num,
-            'vads_trans_date': str(datetime.utcnow().strftime("%Y%m%d%H%M%S")),
+            'vads_trans_date': str(now.strftime("%Y%m%d%H%M%S")),
             'vads_trans_id': str(trans_id),
-            'vads_ctx_mode': str(self._get_ctx_mode()),
-            'vads_page_action': u'PAYMENT',
-            'vads_action_mode': u'INTERACTIVE',
             'vads_payment_config': self._get_payment_config(amount),
-            'vads_version': constants.SYSTEMPAY_PARAMS.get('GATEWAY_VERSION'),
-            'vads_url_return': urlparse.urljoin(base_url, SystempayController._return_url),
             'vads_order_id': str(values.get('reference')),
-            'vads_contrib': constants.SYSTEMPAY_PARAMS.get('CMS_IDENTIFIER') + u'_' + constants.SYSTEMPAY_PARAMS.get('PLUGIN_VERSION') + u'/' + release.version,
-
-            'vads_language': self.systempay_language or '',
-            'vads_available_languages': available_languages,
-            'vads_capture_delay': self.systempay_capture_delay or '',
-            'vads_validation_mode': validation_mode,
-            'vads_payment_cards': payment_cards,
-            'vads_return_mode': str(self.systempay_return_mode),
             'vads_threeds_mpi': threeds_mpi,
-
-            # Customer info.
-            'vads_cust_id': str(values.get('billing_partner_id')) or '',
-            'vads_cust_first_name': values.get('billing_partner_first_name') and values.get('billing_partner_first_name')[0:62] or '',
-            'vads_cust_last_name': values.get('billing_partner_last_name') and values.get('billing_partner_last_name')[0:62] or '',
-            'vads_cust_address': values.get('billing_partner_address') and values.get('billing_partner_address')[0:254] or '',
-            'vads_cust_zip': values.get('billing_partner_zip') and values.get('billing_partner_zip')[0:62] or '',
-            'vads_cust_city': values.get('billing_partner_city') and values.get('billing_partner_city')[0:62] or '',
-            'vads_cust_state': values.get('billing_partner_state').code and values.get('billing_partner_state').code[0:62] or '',
-            'vads_cust_country': values.get('billing_partner_country').code and values.get('billing_partner_country').code.upper() or '',
-            'vads_cust_email': values.get('billing_partner_email') and values.get('billing_partner_email')[0:126] or '',
-            'vads_cust_phone': values.get('billing_partner_phone') and values.get('billing_partner_phone')[0:31] or '',
-
-            # Shipping info.
-            'vads_ship_to_first_name': values.get('partner_first_name') and values.get('partner_first_name')[0:62] or '',
-            'vads_ship_to_last_name': values.get('partner_last_name') and values.get('partner_last_name')[0:62] or '',
-            'vads_ship_to_street': values.get('partner_address') and values.get('partner_address')[0:254] or '',
-            'vads_ship_to_zip': values.get('partner_zip') and values.get('partner_zip')[0:62] or '',
-            'vads_ship_to_city': values.get('partner_city') and values.get('partner_city')[0:62] or '',
-            'vads_ship_to_state': values.get('partner_state').code and values.get('partner_state').code[0:62] or '',
-            'vads_ship_to_country': values.get('partner_country').code and values.get('partner_country').code.upper() or '',
-            'vads_ship_to_phone_num': values.get('partner_phone') and values.get('partner_phone')[0:31] or '',
         })
 
-        if self.systempay_redirect:
-            tx_values.update({
-                'vads_redirect_success_timeout': self.systempay_redirect_success_timeout or '',
-                'vads_redirect_success_message': self.systempay_redirect_success_message or '',
-                'vads_redirect_error_timeout': self.systempay_redirect_error_timeout or '',
-                'vads_redirect_error_message': self.systempay_redirect_error_message or ''
-            })
-
-        systempay_tx_values = dict() # Values encoded in UTF-8.
+        # Customer and shipping info.
+        tx_values.update(form.order_fields(values))
 
-        for key in tx_values.keys():
-            if tx_values[key] == ' ':
-                tx_values[key] = ''
+        if self.provider == 'systempaymulti':
+            schedule = tools.installment_schedule(amount, self._systempay_multi_first(amount), self.systempay_multi_count, self.systempay_multi_period, now.date())
+            self.env['systempay.installment'].sudo()._set_schedule(tx_values['vads_order_id'], schedule, values['currency'].decimal_places)
 
-            systempay_tx_values[key] = tx_values[key].encode('utf-8')
+        form.clean_values(tx_values)
 
+        systempay_tx_values = form.encode_values(tx_values) # Values encoded in UTF-8.
         systempay_tx_values['systempay_signature'] = self._systempay_generate_sign(self, tx_values)
         return systempay_tx_values
 
@@ -268,22 +400,175 @@ class TransactionSystempay(models.Model):
     systempay_card_number = fields.Char(_('Card number'))
     systempay_expiration_date = fields.Char(_('Expiration date'))
     systempay_auth_result = fields.Char(_('Authorization result'))
-    systempay_raw_data = fields.Text(string=_('Transaction log'), readonly=True)
+    systempay_threeds = fields.Boolean(_('3DS authentication'))
+    systempay_raw_data = fields.Text(string=_('Transaction log'), compute='_compute_systempay_raw_data')
+    systempay_notification_ids = fields.One2many('systempay.notification.log', 'transaction_id', readonly=True, groups='base.group_system')
+    systempay_installment_ids = fields.One2many('systempay.installment', 'transaction_id', string=_('Installments'), readonly=True, groups='base.group_system')
+
+    def init(self):
+        # Notifications are matched on reference, already indexed by its unique constraint. Back office exports and web
+        # services are matched on acquirer reference.
+        self.env.cr.execute('DROP INDEX IF EXISTS payment_transaction_reference_idx')
+        self.env.cr.execute('CREATE INDEX IF NOT EXISTS payment_transaction_acquirer_reference_idx ON payment_transaction (acquirer_reference)')
+
+        # 3DS result of transactions paid before it was stored, the certificate is only shown for authenticated ones.
+        self.env.cr.execute(
+            'UPDATE payment_transaction SET systempay_threeds = (html_3ds LIKE %s) '
+            'WHERE systempay_threeds IS NULL AND systempay_trans_status IS NOT NULL AND html_3ds IS NOT NULL',
+            ('%<br />%',)
+        )
+
+    def _compute_systempay_raw_data(self):
+        # Only computed when displayed, notifications are stored in systempay.notification.log.
+        for tx in self:
+            # Log is only readable by administrators, shown to users who can read the transaction.
+            notifications = tx.sudo().systempay_notification_ids
+            tx.systempay_raw_data = '\n'.join(json.dumps(n.get_data(), sort_keys=True) for n in notifications) or False
 
     # --------------------------------------------------
     # FORM RELATED METHODS
     # --------------------------------------------------
 
+    @api.model
+    def form_feedback(self, data, acquirer_name):
+        if acquirer_name != 'systempay':
+            return super(TransactionSystempay, self).form_feedback(data, acquirer_name)
+
+        # Return to shop and IPN often arrive together: handle them one after the other. Controllers and batches
+        # already hold the lock, taking it again is then immediate.
+        with metrics.timer('systempay_stage_seconds', stage='lock'):
+            waited = self._systempay_lock([data.get('vads_order_id')])
+
+        # Systempay retries notifications and return to shop duplicates IPN: answer directly if already applied. After
+        # a wait, the other request may have applied the same notification after this database transaction started.
+        keys = self.env['systempay.notification.key'].sudo()
+        key = keys._make_key(data)
+        result = keys._get_result(key, fresh=waited) if key else None
+        if result is not None:
+            _logger.info('Systempay: notification %s already applied, skipping.', key)
+            metrics.inc('systempay_duplicates_total')
+            return result
+
+        with metrics.timer('systempay_stage_seconds', stage='feedback'):
+            tx = self._systempay_form_get_tx_from_data(data)
+            return super(TransactionSystempay, self.with_context(systempay_tx_ids=tuple(tx.ids))).form_feedback(data, acquirer_name)
+
+    @api.model
+    def _systempay_lock(self, references):
+        """Take transaction-level advisory locks on order references, in a fixed order so concurrent batches cannot
+        deadlock. Wait until locks are free and return whether another request held one.
+
+        After a wait, the REPEATABLE READ snapshot of the current database transaction may predate the commit of the
+        other request: writing a row it changed raises a serialization failure. Use _systempay_lock_fresh to avoid it.
+        """
+
+        keys = sorted(set(r for r in references if r))
+        if not keys:
+            return False
+
+        self.env.cr.execute(_LOCK_TRY_QUERY, (_LOCK_NAMESPACE, keys))
+        if self.env.cr.fetchone()[0]:
+            return False
+
+        self.env.cr.execute(
+            'SELECT count(*) FROM (SELECT pg_advisory_xact_lock(%s, hashtext(r)) FROM unnest(%s::text[]) AS r ORDER BY hashtext(r)) t',
+            (_LOCK_NAMESPACE, keys)
+        )
+        return True
+
+    @api.model
+    def _systempay_lock_fresh(self, references, timeout=None):
+        """Take the locks of _systempay_lock in a new database transaction, so that its snapshot is taken while locks are
+        held and sees what the previous holder committed. The current database transaction is rolled back: call it
+        before anything is written.
+
+        Poll until locks are free, or at most timeout seconds if given. Return whether locks are held: after a timeout,
+        callers must not apply the notification, form_feedback would wait for the locks on an outdated snapshot.
+        """
+
+        keys = sorted(set(r for r in references if r))
+        if not keys:
+            return True
+
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            # Rolling back also releases locks taken by a partly successful attempt.
+            self.env.cr.rollback()
+            self.invalidate_cache()
+
+            self.env.cr.execute(_LOCK_TRY_QUERY, (_LOCK_NAMESPACE, keys))
+            if self.env.cr.fetchone()[0]:
+                return True
+
+            if deadline is not None and time.time() >= deadline:
+                self.env.cr.rollback()
+                return False
+
+            time.sleep(0.05)
+
+    @api.model
+    @ormcache('lang')
+    def _systempay_messages(self, lang):
+        # Cached per language, Odoo clears caches when translations are loaded. _() uses the language of self.
+        self = self.with_context(lang=lang)
+        return {
+            '3ds': _('3DS authentication: '),
+            '3ds_cavv': _('3DS certificate: '),
+            'yes': _('YES'),
+            'no': _('NO'),
+            'auth_result': _('See the transaction details for more information ({}).'),
+        }
+
+    def _systempay_set_applied(self, data, result):
+        key = self.env['systempay.notification.key'].sudo()._make_key(data)
+        if key:
+            self.env['systempay.notification.key'].sudo()._set_result(key, self, result)
+
+        return result
+
+    @api.model
+    def _systempay_form_feedback_batch(self, data_list):
+        """Apply several notifications, resolving their transactions with one query.
+
+        Return a list aligned with data_list holding the feedback result of each notification, or the exception raised
+        while applying it. Notifications are applied one by one in the given order, in a savepoint each.
+        """
+
+        references = list(set(data.get('vads_order_id') for data in data_list if data.get('vads_order_id')))
+        txs = self.search([('reference', 'in', references)]) if references else self.browse()
+        feedback = self.with_context(systempay_tx_ids=tuple(txs.ids))
+
+        # Lock all transactions of the batch up front, in a defined order.
+        self._systempay_lock(txs.mapped('reference'))
+
+        results = [None] * len(data_list)
+        for i in range(len(data_list)):
+            try:
+                with self.env.cr.savepoint():
+                    results[i] = feedback.form_feedback(data_list[i], 'systempay')
+            except Exception as e:
+                results[i] = e
+
+        if hasattr(self, 'flush'):
+            self.flush()
+
+        return results
+
     @api.model
     def _systempay_form_get_tx_from_data(self, data):
         shasign, status, reference = data.get('signature'), data.get('vads_trans_status'), data.get('vads_order_id')
 
         if not reference or not shasign or not status:
-            error_msg = 'Systempay : received bad data {}'.format(data)
-            _logger.error(error_msg)
-            raise ValidationError(error_msg)
+            log.log_data(_logger, logging.ERROR, 'Systempay: received bad data %s', data)
+            raise ValidationError('Systempay: received bad data.')
+
+        with metrics.timer('systempay_stage_seconds', stage='lookup'):
+            if self._context.get('systempay_tx_ids') is not None:
+                # Transactions of the current batch were resolved by _systempay_form_feedback_batch.
+                tx = self.browse(self._context['systempay_tx_ids']).filtered(lambda t: t.reference == reference)
+            else:
+                tx = self.search([('reference', '=', reference)])
 
-        tx = self.search([('reference', '=', reference)])
         if not tx or len(tx) > 1:
             error_msg = 'Systempay: received data for reference {}'.format(reference)
             if not tx:
@@ -294,43 +579,299 @@ class TransactionSystempay(models.Model):
             _logger.error(error_msg)
             raise ValidationError(error_msg)
 
-        # Verify shasign.
-        shasign_check = tx.acquirer_id._systempay_generate_sign('out', data)
-        if shasign_check.upper() != shasign.upper():
-            error_msg = 'Systempay: invalid shasign, received {}, computed {}, for data {}'.format(shasign, shasign_check, data)
-            _logger.info(error_msg)
-            raise ValidationError(error_msg)
+        # Verify shasign, unless it was checked already with the key of the transaction acquirer.
+        with metrics.timer('systempay_stage_seconds', stage='signature'):
+            if self._context.get('systempay_acquirer_id') == tx.acquirer_id.id:
+                valid = True
+            else:
+                valid = tx.acquirer_id._systempay_get_signer().verify(data, shasign)
+
+        if not valid:
+            metrics.inc('systempay_signature_failures_total')
+            log.log_data(_logger, logging.INFO, 'Systempay: invalid shasign for data %s', data)
+            raise ValidationError('Systempay: invalid shasign for reference {}.'.format(reference))
 
         return tx
 
+    @api.model
+    def _systempay_reconcile(self, rows, amount_unit='minor', fix=False):
+        """Compare rows of a Systempay transaction export with transactions.
+
+        Rows are dicts with reference, uuid, amount, currency and status keys. Transactions are fetched with one query
+        per call. Return a list of (reference, field, export value, Odoo value) mismatches. With fix, transactions whose
+        state does not match the gateway status are updated, one write per target state.
+        """
+
+        references = list(set(row['reference'] for row in rows if row.get('reference')))
+        txs = self.search([('reference', 'in', references)]) if references else self.browse()
+        txs_by_ref = dict((tx.reference, tx) for tx in txs)
+
+        mismatches = []
+        to_fix = {}
+        for row in rows:
+            tx = txs_by_ref.get(row.get('reference'))
+            if not tx:
+                mismatches.append((row.get('reference'), 'reference', row.get('uuid'), None))
+                continue
+
+            decimals = tx.currency_id.decimal_places
+            try:
+                amount = int(row['amount']) if amount_unit == 'minor' else tools.to_minor_units(row['amount'], decimals)
+            except (TypeError, ValueError):
+                amount = None
+
+            if amount is None or not tools.same_amount(amount, tx.amount, decimals):
+                mismatches.append((tx.reference, 'amount', row.get('amount'), tx.amount))
+                continue
+
+            currency = tools.get_currency(row.get('currency')) or tools.get_currency_by_num(row.get('currency'))
+            if currency is None or currency is not tools.get_currency(tx.currency_id.name):
+                mismatches.append((tx.reference, 'currency', row.get('currency'), tx.currency_id.name))
+                continue
+
+            state = tools.get_tx_state(row.get('status'))
+            if state != tx.state:
+                mismatches.append((tx.reference, 'status', row.get('status'), tx.state))
+                to_fix.setdefault((state, row.get('status')), []).append(tx.id)
+
+        if fix:
+            for (state, status), ids in to_fix.items():
+                self.browse(ids).write({'state': state, 'systempay_trans_status': status})
+
+        return mismatches
+
+    @api.model
+    def _cron_sync_pending(self, batch_size=None, min_age=None):
+        """Query the gateway for Systempay transactions left pending and apply their current status."""
+
+        params = self.env['ir.config_parameter'].sudo()
+        batch_size = batch_size or int(params.get_param('payment_systempay.sync_batch_size', 200))
+        min_age = min_age or int(params.get_param('payment_systempay.sync_min_age', 15))
+
+        last_id = 0
+        while True:
+            self.env.cr.execute(
+                'SELECT t.id FROM payment_transaction t JOIN payment_acquirer a ON a.id = t.acquirer_id '
+                'WHERE a.provider IN (\'systempay\', \'systempaymulti\') AND t.state = \'pending\' '
+                'AND t.acquirer_reference IS NOT NULL AND t.id > %s '
+                'AND t.write_date < (now() at time zone \'UTC\') - %s * interval \'1 minute\' '
+                'ORDER BY t.id LIMIT %s',
+                (last_id, min_age, batch_size)
+            )
+            ids = [row[0] for row in self.env.cr.fetchall()]
+            if not ids:
+                break
+
+            self.browse(ids)._systempay_sync()
+            self.env.cr.commit()
+
+            last_id = ids[-1]
+            if len(ids) < batch_size:
+                break
+
+        return True
+
+    def _systempay_sync(self):
+        """Fetch status of these transactions from the gateway, with bounded concurrency, then apply changed ones."""
+
+        workers = int(self.env['ir.config_parameter'].sudo().get_param('payment_systempay.ws_workers', 4))
+
+        updated = self.browse()
+        for acquirer in self.mapped('acquirer_id'):
+            txs = self.filtered(lambda t: t.acquirer_id == acquirer and t.acquirer_reference)
+            try:
+                client = acquirer._systempay_get_ws()
+            except ValidationError as e:
+                _logger.warning('Systempay: cannot synchronize transactions of %s: %s', acquirer.name, e)
+                continue
+
+            # Only HTTP calls run in threads, database is used from this thread only.
+            answers = run_bounded(client.get_transaction, txs.mapped('acquirer_reference'), workers)
+            for tx, answer in zip(txs, answers):
+                if isinstance(answer, Exception):
+                    _logger.warning('Systempay: cannot get status of transaction %s: %s', tx.reference, answer)
+                    continue
+
+                data = transaction_data(answer)
+                if tools.get_tx_state(data.get('vads_trans_status')) == tx.state:
+                    continue
+
+                if tx._systempay_form_get_invalid_parameters(data):
+                    _logger.warning('Systempay: gateway data of transaction %s does not match, skipped.', tx.reference)
+                    continue
+
+                try:
+                    with self.env.cr.savepoint():
+                        # Serialize with return to shop and IPN of the same order. After a wait, the order was updated
+                        # after this snapshot was taken: leave it to the next run.
+                        if tx._systempay_lock([tx.reference]):
+                            continue
+
+                        tx._systempay_form_validate(data)
+                except Exception as e:
+                    _logger.warning('Systempay: cannot synchronize transaction %s: %s', tx.reference, e)
+                    continue
+
+                updated |= tx
+
+        return updated
+
+    @api.model
+    def _systempay_export_chunks(self, date_from, date_to, chunk_size=10000):
+        """Yield lists of at most chunk_size rows of Systempay transactions created from date_from and before date_to.
+
+        Rows are tuples of values in export.EXPORT_COLUMNS order, read through a server-side cursor so memory does not
+        grow with row count. A database cursor of its own is used, so rows can be read after the current one is closed.
+        """
+
+        date_column = 'date' if 'date' in self._fields else 'date_validate'
+        query = (
+            'SELECT t.reference, t.amount, c.name, t.systempay_card_brand, t.systempay_card_number, t.systempay_trans_status, '
+            't.state, t.acquirer_reference, t.create_date, t.{} '
+            'FROM payment_transaction t JOIN payment_acquirer a ON a.id = t.acquirer_id '
+            'LEFT JOIN res_currency c ON c.id = t.currency_id '
+            'WHERE a.provider IN (\'systempay\', \'systempaymulti\') AND t.create_date >= %s AND t.create_date < %s '
+            'ORDER BY t.id'
+        ).format(date_column)
+
+        with self.pool.cursor() as cr:
+            server_cursor = cr._cnx.cursor('systempay_export')
+            try:
+                server_cursor.itersize = chunk_size
+                server_cursor.execute(query, (date_from, date_to))
+                while True:
+                    rows = server_cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+
+                    yield rows
+            finally:
+                server_cursor.close()
+
+    def systempay_validate_payments(self, comment=None):
+        """Validate in gateway these payments waiting for manual validation, with bounded concurrency.
+
+        Return a dict with validated transactions, failed ones mapped to an error message and skipped ones, not waiting
+        for validation. New states are saved with one write per resulting status. State message is only saved on
+        transactions whose validation call failed.
+        """
+
+        workers = int(self.env['ir.config_parameter'].sudo().get_param('payment_systempay.ws_workers', 4))
+
+        txs = self.filtered(
+            lambda t: t.acquirer_id.provider in ('systempay', 'systempaymulti') and t.acquirer_reference
+            and t.systempay_trans_status in constants.SYSTEMPAY_TO_VALIDATE_STATUSES
+        )
+        skipped = self - txs
+        failed = {}
+
+        by_status, by_message = {}, {}
+        for acquirer in txs.mapped('acquirer_id'):
+            acquirer_txs = txs.filtered(lambda t: t.acquirer_id == acquirer)
+            try:
+                client = acquirer._systempay_get_ws()
+            except ValidationError as e:
+                failed.update((tx, e.args[0]) for tx in acquirer_txs)
+                continue
+
+            # Only HTTP calls run in threads, database is used from this thread only.
+            answers = run_bounded(
+                lambda uuid: client.validate_transaction(uuid, comment), acquirer_txs.mapped('acquirer_reference'), workers
+            )
+            for tx, answer in zip(acquirer_txs, answers):
+                if isinstance(answer, Exception):
+                    _logger.warning('Systempay: cannot validate transaction %s: %s', tx.reference, answer)
+                    failed[tx] = '{}'.format(answer)
+                    by_message[failed[tx]] = by_message.get(failed[tx], self.browse()) | tx
+                    continue
+
+                status = transaction_data(answer).get('vads_trans_status')
+                by_status[status] = by_status.get(status, self.browse()) | tx
+
+        validated = self.browse()
+        key = 'date' if hasattr(self, 'date') else 'date_validate'
+        for status, status_txs in by_status.items():
+            values = {'systempay_trans_status': status, key: fields.Datetime.now()}
+            state = tools.get_tx_state(status)
+            if state in ('done', 'pending'):
+                values['state'] = state
+
+            status_txs.write(values)
+            validated |= status_txs
+
+        for message, message_txs in by_message.items():
+            message_txs.write({'state_message': message})
+
+        metrics.inc('systempay_validations_total', len(validated), result='validated')
+        metrics.inc('systempay_validations_total', len(failed), result='failed')
+        metrics.inc('systempay_validations_total', len(skipped), result='skipped')
+
+        return {'validated': validated, 'failed': failed, 'skipped': skipped}
+
+    def systempay_action_validate(self):
+        result = self.systempay_validate_payments()
+        if not result['failed'] and not result['skipped']:
+            return False
+
+        # Show transactions that could not be validated, with the reason in their state message if the call failed.
+        return {
+            'name': _('Systempay validation failures'),
+            'type': 'ir.actions.act_window',
+            'res_model': 'payment.transaction',
+            'view_mode': 'tree,form',
+            'domain': [('id', 'in', [tx.id for tx in result['failed']] + result['skipped'].ids)],
+        }
+
     def _systempay_form_get_invalid_parameters(self, data):
+        with metrics.timer('systempay_stage_seconds', stage='validation'):
+            return self._systempay_check_parameters(data)
+
+    def _systempay_check_parameters(self, data):
         invalid_parameters = []
 
         # Check what is bought.
-        amount = float(int(data.get('vads_amount', 0)) / math.pow(10, int(self.currency_id.decimal_places)))
-
-        if float_compare(amount, self.amount, int(self.currency_id.decimal_places)) != 0:
+        decimals = self.currency_id.decimal_places
+        if not tools.same_amount(data.get('vads_amount', 0), self.amount, decimals):
+            amount = tools.from_minor_units(data.get('vads_amount') or 0, decimals)
             invalid_parameters.append(('amount', amount, '{:.2f}'.format(self.amount)))
 
-        currency_code = tools.find_currency(self.currency_id.name)
-        if (currency_code is None) or (int(data.get('vads_currency')) != int(currency_code)):
-            invalid_parameters.append(('currency', data.get('vads_currency'), currency_code))
+        currency = tools.get_currency(self.currency_id.name)
+        if (currency is None) or (tools.get_currency_by_num(data.get('vads_currency')) is not currency):
+            invalid_parameters.append(('currency', data.get('vads_currency'), currency and currency.num))
 
         return invalid_parameters
 
     def _systempay_form_validate(self, data):
-        systempay_statuses = {
-            'success': ['AUTHORISED', 'CAPTURED', 'ACCEPTED'],
-            'pending': ['AUTHORISED_TO_VALIDATE', 'WAITING_AUTHORISATION', 'WAITING_AUTHORISATION_TO_VALIDATE', 'INITIAL', 'UNDER_VERIFICATION', 'WAITING_FOR_PAYMENT', 'PRE_AUTHORISED'],
-            'cancel': ['ABANDONED']
-        }
+        metrics.inc('systempay_notifications_total', status=data.get('vads_trans_status') or '')
+
+        stats = self.env['systempay.stat'].sudo()
+        key = stats._key(self)
 
-        html_3ds = _('3DS authentication: ')
+        with metrics.timer('systempay_stage_seconds', stage='write'):
+            result = self._systempay_apply(data)
+
+        # Journal payment statistics changes in the same database transaction, they are added to statistics by cron.
+        stats._move(self, key)
+        return result
+
+    def _systempay_apply(self, data):
+        self.env['systempay.notification.log']._append(self, data)
+
+        if self.acquirer_id.provider == 'systempaymulti' and data.get('vads_sequence_number'):
+            self.env['systempay.installment'].sudo()._match(self, data)
+
+            # Later installments only update the schedule, order has been paid with the first one.
+            if int(data.get('vads_sequence_number')) > 1:
+                return self._systempay_set_applied(data, tools.get_tx_state(data.get('vads_trans_status')) in ('done', 'pending'))
+
+        messages = self._systempay_messages(tools.env_lang(self.env))
+
+        html_3ds = messages['3ds']
         if data.get('vads_threeds_status') == 'Y':
-            html_3ds += _('YES')
-            html_3ds += '<br />' + _('3DS certificate: ') + data.get('vads_threeds_cavv')
+            html_3ds += messages['yes']
+            html_3ds += '<br />' + messages['3ds_cavv'] + data.get('vads_threeds_cavv')
         else:
-            html_3ds += _('NO')
+            html_3ds += messages['no']
 
         expiry = ''
         if data.get('vads_expiry_month') and data.get('vads_expiry_year'):
@@ -338,12 +879,12 @@ class TransactionSystempay(models.Model):
 
         values = {
             'acquirer_reference': data.get('vads_trans_uuid'),
-            'systempay_raw_data': '{}'.format(data),
             'html_3ds': html_3ds,
             'systempay_trans_status': data.get('vads_trans_status'),
             'systempay_card_brand': data.get('vads_card_brand'),
             'systempay_card_number': data.get('vads_card_number'),
             'systempay_expiration_date': expiry,
+            'systempay_threeds': data.get('vads_threeds_status') == 'Y',
         }
 
         # Set validation date.
@@ -351,35 +892,35 @@ class TransactionSystempay(models.Model):
         values[key] = fields.Datetime.now()
 
         status = data.get('vads_trans_status')
-        if status in systempay_statuses['success']:
+        state = tools.get_tx_state(status)
+        if state == 'done':
             values.update({
                 'state': 'done',
             })
 
             self.write(values)
 
-            return True
-        elif status in systempay_statuses['pending']:
+            return self._systempay_set_applied(data, True)
+        elif state == 'pending':
             values.update({
                 'state': 'pending',
             })
 
             self.write(values)
 
-            return True
-        elif status in systempay_statuses['cancel']:
+            return self._systempay_set_applied(data, True)
+        elif state == 'cancel':
             self.write({
                 'state_message': 'Payment for transaction #%s is cancelled (%s).' % (self.reference, data.get('vads_result')),
                 'state': 'cancel',
             })
 
-            return False
+            return self._systempay_set_applied(data, False)
         else:
             auth_result = data.get('vads_auth_result')
-            auth_message = _('See the transaction details for more information ({}).').format(auth_result)
+            auth_message = messages['auth_result'].format(auth_result)
 
-            error_msg = 'Systempay payment error, transaction status: {}, authorization result: {}.'.format(status, auth_result)
-            _logger.info(error_msg)
+            _logger.info('Systempay payment error, transaction status: %s, authorization result: %s.', status, auth_result)
 
             values.update({
                 'state_message': 'Payment for transaction #%s is refused (%s).' % (self.reference, data.get('vads_result')),
@@ -389,4 +930,4 @@ class TransactionSystempay(models.Model):
 
             self.write(values)
 
-            return False
+            return self._systempay_set_applied(data, False)
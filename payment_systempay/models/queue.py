@@ -0,0 +1,129 @@
+# coding: utf-8
+#
+# Copyright © Lyra Network.
+# This file is part of Systempay plugin for Odoo. See COPYING.md for license details.
+#
+# Author:    Lyra Network (https://www.lyra.com)
+# Copyright: Copyright © Lyra Network
+# License:   http://www.gnu.org/licenses/agpl.html GNU Affero General Public License (AGPL v3)
+
+import json
+import logging
+
+from odoo import api, models, fields
+from odoo.addons.payment.models.payment_acquirer import ValidationError
+
+_logger = logging.getLogger(__name__)
+
+class SystempayIpnQueue(models.Model):
+    _name = 'systempay.ipn.queue'
+    _description = 'Systempay queued notification'
+    _order = 'id'
+
+    transaction_id = fields.Many2one('payment.transaction', readonly=True, index=True, ondelete='cascade')
+    data = fields.Text(readonly=True)
+    state = fields.Selection(selection=[('pending', 'Pending'), ('done', 'Done'), ('failed', 'Failed')], default='pending', readonly=True)
+    attempts = fields.Integer(readonly=True, default=0)
+    next_attempt = fields.Datetime(readonly=True, default=fields.Datetime.now)
+    error = fields.Text(readonly=True)
+
+    _max_attempts = 8
+    _batch_size = 100
+    _retention_days = 30
+    _purge_batch_size = 10000
+
+    def init(self):
+        self.env.cr.execute(
+            'CREATE INDEX IF NOT EXISTS systempay_ipn_queue_pending_idx '
+            'ON systempay_ipn_queue (next_attempt, id) WHERE state = \'pending\''
+        )
+
+    @api.model
+    def _enqueue(self, tx, data):
+        return self.sudo().create({
+            'transaction_id': tx.id,
+            'data': json.dumps(data, sort_keys=True),
+        })
+
+    @api.model
+    def _cron_process_queue(self, batch_size=None):
+        """Apply pending notifications, batch after batch.
+
+        Odoo runs the cron in one worker at a time. Rows are locked with SKIP LOCKED, so a run started by hand does
+        not wait for it, both handling distinct notifications. A failed notification is retried later with an
+        exponential backoff, unless it cannot succeed (unknown order, invalid signature).
+        """
+
+        params = self.env['ir.config_parameter'].sudo()
+        batch_size = batch_size or int(params.get_param('payment_systempay.ipn_queue_batch_size', self._batch_size))
+
+        while True:
+            self.env.cr.execute(
+                'SELECT id FROM systempay_ipn_queue '
+                'WHERE state = \'pending\' AND next_attempt <= (now() at time zone \'UTC\') '
+                'ORDER BY next_attempt, id LIMIT %s FOR UPDATE SKIP LOCKED',
+                (batch_size,)
+            )
+            ids = [row[0] for row in self.env.cr.fetchall()]
+            if not ids:
+                break
+
+            items = self.browse(ids)
+            results = self.env['payment.transaction'].sudo()._systempay_form_feedback_batch([json.loads(item.data) for item in items])
+            for item, result in zip(items, results):
+                if isinstance(result, Exception):
+                    item._set_failed(result)
+                else:
+                    item.write({'state': 'done', 'attempts': item.attempts + 1, 'error': False})
+
+            # Release locks and make results visible batch by batch.
+            self.env.cr.commit()
+
+            if len(ids) < batch_size:
+                break
+
+        return True
+
+    def _set_failed(self, error):
+        self.ensure_one()
+
+        attempts = self.attempts + 1
+        _logger.warning('Systempay: queued notification #%s failed (attempt %s): %s', self.id, attempts, error)
+
+        # Notifications rejected by checks fail the same way on each attempt.
+        if attempts >= self._max_attempts or isinstance(error, ValidationError):
+            self.write({'state': 'failed', 'attempts': attempts, 'error': '{}'.format(error)})
+            return
+
+        self.write({'attempts': attempts, 'error': '{}'.format(error)})
+        self.env.cr.execute(
+            'UPDATE systempay_ipn_queue SET next_attempt = (now() at time zone \'UTC\') + %s * interval \'1 second\' '
+            'WHERE id = %s',
+            (30 * 2 ** (attempts - 1), self.id)
+        )
+        self.invalidate_cache(['next_attempt'], [self.id])
+
+    @api.model
+    def _cron_purge(self, days=None):
+        """Delete applied notifications older than the retention period. Failed ones are kept to be looked into."""
+
+        params = self.env['ir.config_parameter'].sudo()
+        days = days or int(params.get_param('payment_systempay.ipn_queue_days', self._retention_days))
+
+        while True:
+            self.env.cr.execute(
+                'DELETE FROM systempay_ipn_queue WHERE id IN ('
+                '    SELECT id FROM systempay_ipn_queue'
+                '    WHERE state = \'done\' AND write_date < (now() at time zone \'UTC\') - %s * interval \'1 day\''
+                '    LIMIT %s'
+                ')',
+                (days, self._purge_batch_size)
+            )
+            count = self.env.cr.rowcount
+            self.env.cr.commit()
+
+            _logger.info('Systempay: %s queued notifications purged.', count)
+            if count < self._purge_batch_size:
+                break
+
+        return True
@@ -0,0 +1,120 @@
+# coding: utf-8
+#
+# Copyright © Lyra Network.
+# This file is part of Systempay plugin for Odoo. See COPYING.md for license details.
+#
+# Author:    Lyra Network (https://www.lyra.com)
+# Copyright: Copyright © Lyra Network
+# License:   http://www.gnu.org/licenses/agpl.html GNU Affero General Public License (AGPL v3)
+
+from datetime import date, timedelta
+
+from odoo import api, models, fields, _
+
+# Transactions counted by (day, acquirer, currency, card brand, status), from their current Systempay fields.
+_REFRESH_QUERY = (
+    'INSERT INTO systempay_stat (day, acquirer_id, currency_id, card_brand, trans_status, count, amount, threeds_count) '
+    'SELECT t.create_date::date, t.acquirer_id, t.currency_id, COALESCE(t.systempay_card_brand, \'\'), t.systempay_trans_status, '
+    'count(*), sum(t.amount), sum(CASE WHEN t.systempay_threeds THEN 1 ELSE 0 END) '
+    'FROM payment_transaction t JOIN payment_acquirer a ON a.id = t.acquirer_id '
+    'WHERE a.provider IN (\'systempay\', \'systempaymulti\') AND t.systempay_trans_status IS NOT NULL AND t.create_date >= %s '
+    'GROUP BY 1, 2, 3, 4, 5'
+)
+
+# Journal rows deleted and added to the counts of their row, in one statement.
+_FOLD_QUERY = (
+    'WITH moved AS (DELETE FROM systempay_stat_journal RETURNING *) '
+    'INSERT INTO systempay_stat (day, acquirer_id, currency_id, card_brand, trans_status, count, amount, threeds_count) '
+    'SELECT day, acquirer_id, currency_id, card_brand, trans_status, sum(count), sum(amount), sum(threeds_count) '
+    'FROM moved GROUP BY 1, 2, 3, 4, 5 '
+    'ON CONFLICT (day, acquirer_id, currency_id, card_brand, trans_status) DO UPDATE SET '
+    'count = systempay_stat.count + EXCLUDED.count, amount = systempay_stat.amount + EXCLUDED.amount, '
+    'threeds_count = systempay_stat.threeds_count + EXCLUDED.threeds_count'
+)
+
+class SystempayStat(models.Model):
+    _name = 'systempay.stat'
+    _description = 'Systempay payment statistics'
+    _order = 'day desc'
+    _log_access = False
+
+    day = fields.Date(string=_('Day'), readonly=True)
+    acquirer_id = fields.Many2one('payment.acquirer', string=_('Acquirer'), readonly=True, ondelete='cascade')
+    currency_id = fields.Many2one('res.currency', string=_('Currency'), readonly=True)
+    card_brand = fields.Char(string=_('Means of payment'), readonly=True)
+    trans_status = fields.Char(string=_('Transaction status'), readonly=True)
+    count = fields.Integer(string=_('Transactions'), readonly=True)
+    amount = fields.Float(string=_('Amount'), readonly=True)
+    threeds_count = fields.Integer(string=_('3DS authenticated'), readonly=True)
+
+    _sql_constraints = [
+        ('stat_uniq', 'unique(day, acquirer_id, currency_id, card_brand, trans_status)', 'Only one row per day and dimensions.'),
+    ]
+
+    def init(self):
+        # Insert-only journal of count changes made by notifications, added to statistics by cron.
+        self.env.cr.execute(
+            'CREATE TABLE IF NOT EXISTS systempay_stat_journal (day date NOT NULL, '
+            'acquirer_id integer NOT NULL REFERENCES payment_acquirer ON DELETE CASCADE, currency_id integer, '
+            'card_brand varchar NOT NULL, trans_status varchar NOT NULL, count integer NOT NULL, amount numeric, '
+            'threeds_count integer NOT NULL)'
+        )
+
+        # Count existing history on install.
+        self.env.cr.execute('SELECT 1 FROM systempay_stat LIMIT 1')
+        if not self.env.cr.fetchone():
+            self._refresh()
+
+    @api.model
+    def _key(self, tx):
+        return tx.systempay_trans_status or '', tx.systempay_card_brand or '', bool(tx.systempay_threeds)
+
+    @api.model
+    def _move(self, tx, old_key):
+        """Count transaction in the row of its current status instead of the one of old_key, as returned by _key.
+
+        Changes are appended to the journal, shared statistics rows are not locked by the current transaction.
+        """
+
+        new_key = self._key(tx)
+        if new_key == old_key:
+            return
+
+        for (status, brand, threeds), sign in ((old_key, -1), (new_key, 1)):
+            if not status:
+                continue
+
+            self.env.cr.execute(
+                'INSERT INTO systempay_stat_journal (day, acquirer_id, currency_id, card_brand, trans_status, count, amount, threeds_count) '
+                'SELECT create_date::date, acquirer_id, currency_id, %s, %s, %s, %s * amount, %s FROM payment_transaction WHERE id = %s',
+                (brand, status, sign, sign, sign if threeds else 0, tx.id)
+            )
+
+    @api.model
+    def _fold(self):
+        """Add journal changes to statistics rows."""
+
+        self.env.cr.execute(_FOLD_QUERY)
+
+    @api.model
+    def _refresh(self, day_from=None):
+        """Count again transactions created from day_from, all of them if not given."""
+
+        day_from = day_from or date(1970, 1, 1)
+
+        # Journal changes of these days are already in the counted transactions.
+        self.env.cr.execute('DELETE FROM systempay_stat_journal WHERE day >= %s', (day_from,))
+        self.env.cr.execute('DELETE FROM systempay_stat WHERE day >= %s', (day_from,))
+        self.env.cr.execute(_REFRESH_QUERY, (day_from,))
+
+    @api.model
+    def _cron_refresh(self, days=None):
+        """Catch up with transactions changed out of notifications (reconciliation, bulk validation, manual edition)."""
+
+        days = days or int(self.env['ir.config_parameter'].sudo().get_param('payment_systempay.stat_refresh_days', 7))
+        self._fold()
+        self._refresh(date.today() - timedelta(days=days))
+
+    @api.model
+    def _cron_fold(self):
+        self._fold()
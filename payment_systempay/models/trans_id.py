@@ -0,0 +1,56 @@
+# coding: utf-8
+#
+# Copyright © Lyra Network.
+# This file is part of Systempay plugin for Odoo. See COPYING.md for license details.
+#
+# Author:    Lyra Network (https://www.lyra.com)
+# Copyright: Copyright © Lyra Network
+# License:   http://www.gnu.org/licenses/agpl.html GNU Affero General Public License (AGPL v3)
+
+from odoo import api, models
+
+from ..helpers.trans_id import TRANS_ID_MAX, BlockTransIdAllocator, TimeTransIdAllocator
+
+# Allocators per database.
+_allocators = {}
+
+def _reserve(registry, size):
+    # nextval is not transactional: no lock nor serialization conflict between workers, and a rollback of the payment
+    # does not give back a block still in use. Identifiers wrap around after TRANS_ID_MAX, so they stay unique over a
+    # day as long as less than TRANS_ID_MAX + 1 are reserved in that day.
+    with registry.cursor() as cr:
+        cr.execute('SELECT nextval(\'systempay_trans_id_seq\')')
+        return cr.fetchone()[0] % (TRANS_ID_MAX + 1)
+
+class SystempayTransIdBlock(models.AbstractModel):
+    _name = 'systempay.trans.id.block'
+    _description = 'Systempay reserved transaction identifiers'
+
+    # Must divide TRANS_ID_MAX + 1 so that blocks do not overlap when identifiers wrap around.
+    _block_size = 50
+
+    def init(self):
+        self.env.cr.execute(
+            'CREATE SEQUENCE IF NOT EXISTS systempay_trans_id_seq INCREMENT BY %s MINVALUE 0 START WITH 0',
+            (self._block_size,)
+        )
+        self.env.cr.execute('ALTER SEQUENCE systempay_trans_id_seq INCREMENT BY %s', (self._block_size,))
+
+    @api.model
+    def _get_allocator(self):
+        mode = self.env['ir.config_parameter'].sudo().get_param('payment_systempay.trans_id_allocator', 'block')
+        key = (self.env.cr.dbname, mode)
+
+        if key not in _allocators:
+            if mode == 'time':
+                _allocators[key] = TimeTransIdAllocator()
+            else:
+                # Allocator outlives request environments, only keep the registry.
+                registry = self.pool
+                _allocators[key] = BlockTransIdAllocator(lambda day, size: _reserve(registry, size), self._block_size)
+
+        return _allocators[key]
+
+    @api.model
+    def allocate(self, now):
+        return self._get_allocator().allocate(now)
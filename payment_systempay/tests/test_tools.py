@@ -0,0 +1,162 @@
+# coding: utf-8
+#
+# Copyright © Lyra Network.
+# This file is part of Systempay plugin for Odoo. See COPYING.md for license details.
+#
+# Author:    Lyra Network (https://www.lyra.com)
+# Copyright: Copyright © Lyra Network
+# License:   http://www.gnu.org/licenses/agpl.html GNU Affero General Public License (AGPL v3)
+
+"""Unit tests of helpers/tools.py. Do not need Odoo:
+
+    python -m unittest discover -s tests
+"""
+
+from datetime import date
+from os import path
+import sys
+import unittest
+
+# Helpers do not depend on Odoo.
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+from helpers import tools
+
+class FakeCursor(object):
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def execute(self, query, params=None):
+        self.queries.append((query, params))
+
+    def fetchall(self):
+        return self.rows
+
+class FakeEnv(object):
+    uid = 2
+
+    def __init__(self, rows):
+        self.cr = FakeCursor(rows)
+
+class CurrencyTest(unittest.TestCase):
+    def test_get_currency(self):
+        self.assertEqual(tools.get_currency('EUR'), ('EUR', '978', 2))
+        self.assertIsNone(tools.get_currency('XXX'))
+
+    def test_get_currency_by_num(self):
+        self.assertEqual(tools.get_currency_by_num('978').alpha, 'EUR')
+        self.assertEqual(tools.get_currency_by_num(36).alpha, 'AUD')
+        self.assertIsNone(tools.get_currency_by_num(None))
+        self.assertIsNone(tools.get_currency_by_num('000'))
+
+    def test_find_currency(self):
+        self.assertEqual(tools.find_currency('EUR'), '978')
+        self.assertIsNone(tools.find_currency(None))
+
+class MinorUnitsTest(unittest.TestCase):
+    def test_round_half_up(self):
+        self.assertEqual(tools.to_minor_units(0.125, 2), 13)
+        self.assertEqual(tools.to_minor_units(0.135, 2), 14)
+        self.assertEqual(tools.to_minor_units(1234.5, 0), 1235)
+        self.assertEqual(tools.to_minor_units(0.05, 1), 1)
+
+    def test_float_noise(self):
+        # 1.005 and 2.675 are stored slightly below their decimal value as floats.
+        self.assertEqual(tools.to_minor_units(1.005, 2), 101)
+        self.assertEqual(tools.to_minor_units(2.675, 2), 268)
+        self.assertEqual(tools.to_minor_units(0.1 + 0.2, 2), 30)
+        self.assertEqual(tools.to_minor_units(49.9, 2), 4990)
+
+    def test_exponents(self):
+        self.assertEqual(tools.to_minor_units(12.345, 3), 12345)
+        self.assertEqual(tools.to_minor_units('49.9', 2), 4990)
+        self.assertEqual(tools.to_minor_units(0, 2), 0)
+
+    def test_from_minor_units(self):
+        self.assertEqual(tools.from_minor_units(4990, 2), 49.9)
+        self.assertEqual(tools.from_minor_units('1235', 0), 1235.0)
+        self.assertEqual(tools.from_minor_units(12345, 3), 12.345)
+
+    def test_round_trip(self):
+        for minor in (0, 1, 99, 100, 4990, 123456789):
+            self.assertEqual(tools.to_minor_units(tools.from_minor_units(minor, 2), 2), minor)
+
+    def test_same_amount(self):
+        self.assertTrue(tools.same_amount('4990', 49.9, 2))
+        self.assertTrue(tools.same_amount(101, 1.005, 2))
+        self.assertFalse(tools.same_amount('4991', 49.9, 2))
+        self.assertFalse(tools.same_amount('', 49.9, 2))
+        self.assertFalse(tools.same_amount(None, 49.9, 2))
+        self.assertFalse(tools.same_amount('49.90', 49.9, 2))
+
+class TxStateTest(unittest.TestCase):
+    def test_get_tx_state(self):
+        self.assertEqual(tools.get_tx_state('AUTHORISED'), 'done')
+        self.assertEqual(tools.get_tx_state('AUTHORISED_TO_VALIDATE'), 'pending')
+        self.assertEqual(tools.get_tx_state('ABANDONED'), 'cancel')
+        self.assertEqual(tools.get_tx_state('REFUSED'), 'error')
+        self.assertEqual(tools.get_tx_state(None), 'error')
+
+class InstallmentScheduleTest(unittest.TestCase):
+    start = date(2020, 1, 31)
+
+    def test_remainder_on_last(self):
+        schedule = tools.installment_schedule(10000, 3334, 3, 30, self.start)
+
+        self.assertEqual([a for _s, _d, a in schedule], [3334, 3333, 3333])
+        self.assertEqual(sum(a for _s, _d, a in schedule), 10000)
+
+        schedule = tools.installment_schedule(10001, 2000, 4, 30, self.start)
+        self.assertEqual([a for _s, _d, a in schedule], [2000, 2667, 2667, 2667])
+
+        schedule = tools.installment_schedule(10000, 1000, 4, 30, self.start)
+        self.assertEqual([a for _s, _d, a in schedule], [1000, 3000, 3000, 3000])
+
+        schedule = tools.installment_schedule(100, 10, 4, 30, self.start)
+        self.assertEqual([a for _s, _d, a in schedule], [10, 30, 30, 30])
+
+        schedule = tools.installment_schedule(101, 10, 4, 30, self.start)
+        self.assertEqual([a for _s, _d, a in schedule], [10, 30, 30, 31])
+
+    def test_sum(self):
+        for amount in (1, 99, 4990, 10001, 123457):
+            for count in (2, 3, 4, 7, 12):
+                first = amount // count
+                schedule = tools.installment_schedule(amount, first, count, 30, self.start)
+                self.assertEqual(len(schedule), count)
+                self.assertEqual(sum(a for _s, _d, a in schedule), amount)
+                self.assertEqual(schedule[0][2], first)
+
+    def test_sequences_and_dates(self):
+        schedule = tools.installment_schedule(9000, 3000, 3, '30', self.start)
+
+        self.assertEqual([s for s, _d, _a in schedule], [1, 2, 3])
+        self.assertEqual([d for _s, d, _a in schedule], [date(2020, 1, 31), date(2020, 3, 1), date(2020, 3, 31)])
+
+    def test_single_payment(self):
+        self.assertEqual(tools.installment_schedule(4990, 1000, 1, 30, self.start), [(1, self.start, 4990)])
+        self.assertEqual(tools.installment_schedule(4990, 1000, 0, 30, self.start), [(1, self.start, 4990)])
+
+class SeedCodesTest(unittest.TestCase):
+    def test_insert_missing(self):
+        env = FakeEnv([('fr',)])
+
+        count = tools.seed_codes(env, 'systempay_language', {'fr': 'French', 'de': 'German', 'en': 'English'})
+
+        self.assertEqual(count, 2)
+        self.assertEqual(len(env.cr.queries), 2)
+
+        query, params = env.cr.queries[1]
+        self.assertTrue(query.startswith('INSERT INTO systempay_language '))
+        self.assertEqual(query.count('(%s, %s, %s, %s,'), 2)
+        self.assertEqual(params, ['de', 'German', 2, 2, 'en', 'English', 2, 2])
+
+    def test_nothing_missing(self):
+        env = FakeEnv([('fr',), ('de',)])
+
+        self.assertEqual(tools.seed_codes(env, 'systempay_language', {'fr': 'French', 'de': 'German'}), 0)
+        self.assertEqual(len(env.cr.queries), 1)
+
+if __name__ == '__main__':
+    unittest.main()
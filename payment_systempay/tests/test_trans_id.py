@@ -0,0 +1,119 @@
+# coding: utf-8
+#
+# Copyright © Lyra Network.
+# This file is part of Systempay plugin for Odoo. See COPYING.md for license details.
+#
+# Author:    Lyra Network (https://www.lyra.com)
+# Copyright: Copyright © Lyra Network
+# License:   http://www.gnu.org/licenses/agpl.html GNU Affero General Public License (AGPL v3)
+
+"""Unit tests of helpers/trans_id.py. Do not need Odoo:
+
+    python -m unittest discover -s tests
+"""
+
+from datetime import datetime
+from os import path
+import sys
+import threading
+import unittest
+
+# Helpers do not depend on Odoo.
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+from helpers.trans_id import TRANS_ID_MAX, BlockTransIdAllocator, TimeTransIdAllocator
+
+class Sequence(object):
+    """Shared counter reserving blocks like systempay_trans_id_seq in models/trans_id.py."""
+
+    def __init__(self, start=0):
+        self.value = start
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, day, size):
+        with self._lock:
+            value, self.value = self.value, self.value + size
+            self.calls += 1
+
+        return value % (TRANS_ID_MAX + 1)
+
+class BlockTransIdAllocatorTest(unittest.TestCase):
+    now = datetime(2020, 4, 7, 12, 0, 0)
+
+    def test_format(self):
+        allocator = BlockTransIdAllocator(Sequence().reserve, 50)
+
+        self.assertEqual(allocator.allocate(self.now), '000000')
+        self.assertEqual(allocator.allocate(self.now), '000001')
+
+    def test_one_reservation_per_block(self):
+        sequence = Sequence()
+        allocator = BlockTransIdAllocator(sequence.reserve, 50)
+
+        ids = [allocator.allocate(self.now) for _i in range(120)]
+
+        self.assertEqual(sequence.calls, 3)
+        self.assertEqual(ids, [str(i).rjust(6, '0') for i in range(120)])
+
+    def test_unique_between_processes(self):
+        sequence = Sequence()
+        allocators = [BlockTransIdAllocator(sequence.reserve, 50) for _i in range(4)]
+
+        ids = [allocators[i % 4].allocate(self.now) for i in range(1000)]
+
+        self.assertEqual(len(set(ids)), 1000)
+
+    def test_unique_between_threads(self):
+        allocator = BlockTransIdAllocator(Sequence().reserve, 50)
+        ids = []
+
+        def allocate():
+            for _i in range(500):
+                ids.append(allocator.allocate(self.now))
+
+        threads = [threading.Thread(target=allocate) for _i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(set(ids)), 2000)
+
+    def test_new_block_on_day_change(self):
+        sequence = Sequence()
+        allocator = BlockTransIdAllocator(sequence.reserve, 50)
+
+        allocator.allocate(datetime(2020, 4, 7, 23, 59, 59))
+        self.assertEqual(allocator.allocate(datetime(2020, 4, 8, 0, 0, 0)), '000050')
+        self.assertEqual(sequence.calls, 2)
+
+    def test_wrap_around(self):
+        # Last block of the range, then back to 0: identifiers stay within gateway bounds.
+        allocator = BlockTransIdAllocator(Sequence(TRANS_ID_MAX + 1 - 50).reserve, 50)
+
+        ids = [int(allocator.allocate(self.now)) for _i in range(100)]
+
+        self.assertEqual(ids, list(range(TRANS_ID_MAX + 1 - 50, TRANS_ID_MAX + 1)) + list(range(50)))
+
+    def test_unique_around_wrap(self):
+        # Daily uniqueness holds while less than TRANS_ID_MAX + 1 identifiers are reserved in the day, wherever the
+        # sequence starts from.
+        sequence = Sequence(TRANS_ID_MAX + 1 - 500)
+        allocators = [BlockTransIdAllocator(sequence.reserve, 50) for _i in range(3)]
+
+        ids = [allocators[i % 3].allocate(self.now) for i in range(3000)]
+
+        self.assertEqual(len(set(ids)), 3000)
+        self.assertTrue(all(0 <= int(i) <= TRANS_ID_MAX for i in ids))
+
+class TimeTransIdAllocatorTest(unittest.TestCase):
+    def test_tenths_of_second_since_midnight(self):
+        allocator = TimeTransIdAllocator()
+
+        self.assertEqual(allocator.allocate(datetime(2020, 4, 7, 0, 0, 0)), '000000')
+        self.assertEqual(allocator.allocate(datetime(2020, 4, 7, 0, 0, 1, 250000)), '000012')
+        self.assertEqual(allocator.allocate(datetime(2020, 4, 7, 23, 59, 59, 900000)), '863999')
+
+if __name__ == '__main__':
+    unittest.main()